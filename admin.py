@@ -1,18 +1,139 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
 from .models import Customer, LoanApplication, ChatMessage
 
+CURSOR_VAR = 'cursor'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count never scans a large table
+
+    Unfiltered lists use the planner's row estimate on PostgreSQL. Anything
+    else is counted up to COUNT_LIMIT rows and shown as "N+" past that.
+    """
+    COUNT_LIMIT = 10000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estimated = False
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.COUNT_LIMIT:
+                self.estimated = True
+                return int(row[0])
+        count = queryset.order_by()[:self.COUNT_LIMIT + 1].count()
+        if count > self.COUNT_LIMIT:
+            self.capped = True
+            return self.COUNT_LIMIT
+        return count
+
+    @property
+    def count_label(self):
+        count = self.count
+        if self.capped:
+            return f'{count:,}+'
+        return f'~{count:,}' if self.estimated else f'{count:,}'
+
+
+class KeysetChangeList(ChangeList):
+    """Changelist paged by primary key (?cursor=<last pk>) instead of OFFSET
+
+    Used for the default newest-first ordering. Sorting by a column falls
+    back to regular page numbers.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = False
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        queryset = self.queryset
+        if self.cursor and self.cursor.isdigit():
+            queryset = queryset.filter(pk__lt=int(self.cursor))
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_cursor = rows[-1].pk
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.keyset = True
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor) or self.next_cursor is not None
+        self.paginator = paginator
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing filters, search or ordering starts again from the first page
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string()
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor is None:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-pk',)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'phone', 'email', 'pre_approved_limit', 'pre_approved_rate')
-    search_fields = ('phone', 'name', 'email')
+    search_fields = ('phone__startswith', 'name', 'email')
 
 @admin.register(LoanApplication)
-class LoanApplicationAdmin(admin.ModelAdmin):
+class LoanApplicationAdmin(LargeTableAdmin):
     list_display = ('application_id', 'customer', 'requested_amount', 'status', 'created_at')
-    search_fields = ('application_id', 'customer__phone')
+    list_select_related = ('customer',)
+    # Prefix lookups so the application_id and phone indexes can serve them
+    search_fields = ('application_id__startswith', 'customer__phone__startswith')
     list_filter = ('status', 'created_at')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('customer',)
 
 @admin.register(ChatMessage)
-class ChatMessageAdmin(admin.ModelAdmin):
+class ChatMessageAdmin(LargeTableAdmin):
     list_display = ('application', 'message_type', 'created_at')
+    list_select_related = ('application__customer',)
     list_filter = ('message_type', 'created_at')
+    raw_id_fields = ('application',)
@@ -0,0 +1,241 @@
+"""
+Columnar export of customers, loan_applications and chat_messages.
+
+Rows are streamed in chunks through a server-side cursor (queryset
+.iterator() on PostgreSQL) and written as Parquet row groups or Arrow IPC
+record batches. Output is Hive-partitioned by day:
+
+    <output>/<table>/date=YYYY-MM-DD/part-<run>-<n>.parquet
+
+Each table has a watermark column (updated_at, or created_at for the
+append-only chat_messages). A run exports rows after the watermark saved in
+<output>/_watermarks.json and moves it forward when the table is done, so
+repeated runs are incremental. Updated rows are exported again; readers keep
+the latest copy of each id. Rows newer than `lag` seconds are left for the
+next run, so transactions still in flight are not skipped.
+
+Rows arrive ordered by the watermark, so only one partition file is open at
+a time and memory stays at about one chunk per table. Identity documents
+(Aadhaar/PAN) and customer contact details are not exported. Chat messages
+carry them too (the user's own messages echo the KYC and details forms), so
+only agent messages keep their text and metadata. Agent text is exported
+only when it is stored as a template, with the name and email parameters
+redacted.
+"""
+
+import json
+import os
+from datetime import timedelta
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .message_templates import render
+from .models import ChatMessage, Customer, LoanApplication
+
+
+TIMESTAMP = pa.timestamp('us', tz='UTC')
+
+AGENT_MESSAGE_TYPES = {value for value, _ in ChatMessage.MESSAGE_TYPE_CHOICES} - {'user'}
+REDACTED_PARAMS = ('name', 'email')
+
+
+def _message_row(row):
+    message_id, application_id, message_type, content, template, params, metadata, created_at = row
+    if message_type not in AGENT_MESSAGE_TYPES:
+        return message_id, application_id, message_type, None, None, None, created_at
+    if template is not None and params:
+        params = {key: '[redacted]' if key in REDACTED_PARAMS else value for key, value in params.items()}
+    return (
+        message_id, application_id, message_type, template,
+        render(template, params) if template is not None else None,
+        json.dumps(metadata, separators=(',', ':')) if metadata else None,
+        created_at,
+    )
+
+TABLES = {
+    'customers': {
+        'model': Customer,
+        'watermark': 'updated_at',
+        'columns': [
+            ('id', pa.int64()),
+            ('pre_approved_limit', pa.decimal128(12, 2)),
+            ('pre_approved_rate', pa.decimal128(5, 2)),
+            ('created_at', TIMESTAMP),
+            ('updated_at', TIMESTAMP),
+        ],
+    },
+    'loan_applications': {
+        'model': LoanApplication,
+        'watermark': 'updated_at',
+        'columns': [
+            ('id', pa.int64()),
+            ('application_id', pa.string()),
+            ('customer_id', pa.int64()),
+            ('requested_amount', pa.decimal128(12, 2)),
+            ('tenure_months', pa.int32()),
+            ('interest_rate', pa.decimal128(5, 2)),
+            ('emi', pa.decimal128(12, 2)),
+            ('credit_score', pa.int32()),
+            ('monthly_income', pa.decimal128(12, 2)),
+            ('foir', pa.decimal128(5, 2)),
+            ('status', pa.string()),
+            ('kyc_verified', pa.bool_()),
+            ('created_at', TIMESTAMP),
+            ('updated_at', TIMESTAMP),
+        ],
+    },
+    'chat_messages': {
+        'model': ChatMessage,
+        'watermark': 'created_at',
+        'columns': [
+            ('id', pa.int64()),
+            ('application_id', pa.int64()),
+            ('message_type', pa.string()),
+            ('template', pa.int16()),
+            ('content', pa.string()),
+            ('metadata', pa.string()),
+            ('created_at', TIMESTAMP),
+        ],
+        # Stored as template id + params; exported as the rendered text, agent messages only
+        'fields': ['id', 'application_id', 'message_type', 'content', 'template', 'params', 'metadata', 'created_at'],
+        'convert': _message_row,
+    },
+}
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+class PartitionWriter:
+    """Writes record batches to one file per date partition, one open at a time"""
+
+    def __init__(self, directory, schema, fmt, run):
+        self.directory = directory
+        self.schema = schema
+        self.fmt = fmt
+        self.run = run
+        self.date = None
+        self.files = []
+        self._writer = None
+        self._sink = None
+
+    def write(self, date, columns):
+        if date != self.date:
+            self.close()
+            self.date = date
+            folder = os.path.join(self.directory, f'date={date.isoformat()}')
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f'part-{self.run}-{len(self.files):04d}{FORMATS[self.fmt]}.tmp')
+            self.files.append(path)
+            if self.fmt == 'parquet':
+                self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+            else:
+                self._sink = pa.OSFile(path, 'wb')
+                self._writer = ipc.new_file(self._sink, self.schema)
+        batch = pa.record_batch(columns, schema=self.schema)
+        if self.fmt == 'parquet':
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def commit(self):
+        """Give finished files their final names"""
+        self.close()
+        for path in self.files:
+            os.replace(path, path[:-len('.tmp')])
+
+    def abort(self):
+        self.close()
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def load_watermarks(output):
+    path = os.path.join(output, '_watermarks.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(output, watermarks):
+    path = os.path.join(output, '_watermarks.json')
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+
+def export_table(name, output, watermark=None, chunk_size=10000, fmt='parquet', lag=300, run=None):
+    """Export rows after `watermark`; returns (rows, new watermark)"""
+    spec = TABLES[name]
+    column = spec['watermark']
+    fields = spec.get('fields') or [field for field, _ in spec['columns']]
+    convert = spec.get('convert')
+    schema = pa.schema(spec['columns'])
+    position = fields.index(column)
+
+    queryset = spec['model'].objects.filter(**{f'{column}__lt': timezone.now() - timedelta(seconds=lag)})
+    if watermark:
+        after = parse_datetime(watermark['value'])
+        queryset = queryset.filter(
+            Q(**{f'{column}__gt': after}) | Q(**{column: after, 'id__gt': watermark['id']})
+        )
+    rows = queryset.order_by(column, 'id').values_list(*fields).iterator(chunk_size=chunk_size)
+
+    run = run or timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    writer = PartitionWriter(os.path.join(output, name), schema, fmt, run)
+    buffer, buffer_date, count, last = [], None, 0, None
+
+    def flush():
+        if buffer:
+            writer.write(buffer_date, [list(values) for values in zip(*buffer)])
+            buffer.clear()
+
+    try:
+        for row in rows:
+            date = timezone.localdate(row[position])
+            if date != buffer_date:
+                flush()
+                buffer_date = date
+            buffer.append(convert(row) if convert else row)
+            if len(buffer) >= chunk_size:
+                flush()
+            count += 1
+            last = row
+        flush()
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+    if last is None:
+        return 0, watermark
+    return count, {'value': last[position].isoformat(), 'id': last[0]}
+
+
+def export(output, tables=None, full=False, **options):
+    """Export each table and persist its watermark as soon as it is done"""
+    watermarks = {} if full else load_watermarks(output)
+    run = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    counts = {}
+    for name in tables or TABLES:
+        counts[name], watermarks[name] = export_table(
+            name, output, watermarks.get(name), run=run, **options
+        )
+        if watermarks[name] is None:
+            del watermarks[name]
+        save_watermarks(output, watermarks)
+    return counts
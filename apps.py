@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        from django.db.models.signals import pre_save, post_save, post_delete
+        from .models import Customer, LoanApplication, ChatMessage
+        from .conversation import sync_state, drop_state
+        from .phone_filter import track_customer
+        from .funnel import record_transition
+        from .tracing import ENABLED as TRACING_ENABLED, tag_chat_message
+        from . import checks  # noqa: F401  (registers the system checks)
+
+        post_save.connect(sync_state, sender=LoanApplication, dispatch_uid='conversation_sync_state')
+        post_delete.connect(drop_state, sender=LoanApplication, dispatch_uid='conversation_drop_state')
+        post_save.connect(record_transition, sender=LoanApplication, dispatch_uid='funnel_record_transition')
+        post_save.connect(track_customer, sender=Customer, dispatch_uid='phone_filter_track_customer')
+        if TRACING_ENABLED:
+            pre_save.connect(tag_chat_message, sender=ChatMessage, dispatch_uid='tracing_tag_chat_message')
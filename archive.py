@@ -0,0 +1,194 @@
+"""
+Cold storage for chat transcripts of finished applications.
+
+`archive_transcripts` moves the chat messages of sanctioned or rejected
+applications last updated more than CHAT_ARCHIVE_AFTER_DAYS ago out of
+chat_messages and into gzip-compressed JSON-lines segments under
+CHAT_ARCHIVE_DIR. Each transcript is written as its own gzip member, so an
+ArchivedTranscript row (segment, offset, length) is enough to read one
+transcript back with a single seek and a small read. Segments roll over at
+CHAT_ARCHIVE_SEGMENT_BYTES.
+
+The bytes are written and fsynced before the index rows are committed and
+the messages deleted. That transaction locks the applications, re-checks
+that they are still archivable and deletes only the messages it wrote, so
+an application that changed meanwhile is skipped and a message added after
+the read stays in chat_messages. A crash in between leaves unreferenced
+bytes in a segment, never a lost transcript.
+
+Archived messages are stored exactly as ChatMessageSerializer renders them,
+so `load_transcript` hands back what get_application would have returned.
+
+On PostgreSQL chat_messages can also be range-partitioned by month so that
+old partitions can be detached once archived. Django cannot create a
+partitioned table, so the one-off conversion is manual, e.g.
+
+    ALTER TABLE chat_messages RENAME TO chat_messages_old;
+    CREATE TABLE chat_messages (LIKE chat_messages_old INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at);
+    ALTER TABLE chat_messages ADD PRIMARY KEY (id, created_at);
+    CREATE TABLE chat_messages_history PARTITION OF chat_messages DEFAULT;
+    INSERT INTO chat_messages SELECT * FROM chat_messages_old;
+
+after which `ensure_partitions` keeps monthly partitions created ahead of time.
+"""
+
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedTranscript, ChatMessage, LoanApplication
+from .serializers import ChatMessageSerializer
+
+
+ARCHIVABLE_STATUSES = ('sanctioned', 'rejected')
+DELETE_BATCH = 900  # ids per DELETE, under SQLite's bound-parameter limit
+
+
+class SegmentWriter:
+    """Appends gzip members to size-capped segment files"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.name = None
+        self._file = None
+        self._serial = 0
+
+    def _open(self):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        while True:
+            self._serial += 1
+            self.name = f'chat-{stamp}-{self._serial:04d}.jsonl.gz'
+            try:
+                # 'x' so two archivers never share a segment
+                self._file = open(os.path.join(self.directory, self.name), 'xb')
+                return
+            except FileExistsError:
+                continue
+
+    def write(self, messages):
+        """Write one transcript; returns (segment, offset, length)"""
+        if self._file is None or self._file.tell() >= self.max_bytes:
+            self._open()
+        lines = ''.join(json.dumps(message, separators=(',', ':')) + '\n' for message in messages)
+        payload = gzip.compress(lines.encode(), mtime=0)
+        offset = self._file.tell()
+        self._file.write(payload)
+        return self.name, offset, len(payload)
+
+    def sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+def finished(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return LoanApplication.objects.filter(
+        status__in=ARCHIVABLE_STATUSES,
+        updated_at__lt=cutoff,
+        archived_transcript__isnull=True,
+    )
+
+
+def archivable(days):
+    return finished(days).filter(messages__isnull=False).distinct().order_by('id')
+
+
+def archive_transcripts(days=None, batch_size=500, limit=None):
+    """Archive finished applications' transcripts; returns (applications, messages)"""
+    days = settings.CHAT_ARCHIVE_AFTER_DAYS if days is None else days
+    writer = SegmentWriter(settings.CHAT_ARCHIVE_DIR, settings.CHAT_ARCHIVE_SEGMENT_BYTES)
+    archived_apps = archived_messages = 0
+    try:
+        while limit is None or archived_apps < limit:
+            size = batch_size if limit is None else min(batch_size, limit - archived_apps)
+            app_ids = list(archivable(days).values_list('id', flat=True)[:size])
+            if not app_ids:
+                break
+
+            transcripts = {}
+            messages = ChatMessage.objects.filter(application_id__in=app_ids).order_by('application_id', 'created_at', 'id')
+            for message in messages:
+                transcripts.setdefault(message.application_id, []).append(message)
+
+            index, written = [], {}
+            for app_id, transcript in transcripts.items():
+                segment, offset, length = writer.write(ChatMessageSerializer(transcript, many=True).data)
+                index.append(ArchivedTranscript(
+                    application_id=app_id, segment=segment, offset=offset,
+                    length=length, message_count=len(transcript),
+                ))
+                written[app_id] = [message.id for message in transcript]
+            writer.sync()
+
+            with transaction.atomic():
+                still_finished = set(
+                    finished(days).select_for_update(of=('self',)).filter(id__in=app_ids).values_list('id', flat=True)
+                )
+                index = [entry for entry in index if entry.application_id in still_finished]
+                ArchivedTranscript.objects.bulk_create(index)
+                message_ids = [pk for entry in index for pk in written[entry.application_id]]
+                for start in range(0, len(message_ids), DELETE_BATCH):
+                    ChatMessage.objects.filter(id__in=message_ids[start:start + DELETE_BATCH]).delete()
+            archived_apps += len(index)
+            archived_messages += len(message_ids)
+    finally:
+        writer.close()
+    return archived_apps, archived_messages
+
+
+def read_segment(segment, offset, length):
+    path = os.path.join(settings.CHAT_ARCHIVE_DIR, os.path.basename(segment))
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        payload = f.read(length)
+    return [json.loads(line) for line in gzip.decompress(payload).decode().splitlines() if line]
+
+
+def load_transcript(application):
+    """Archived messages for an application, or [] if it has none"""
+    entry = ArchivedTranscript.objects.filter(application=application).first()
+    if entry is None:
+        return []
+    return read_segment(entry.segment, entry.offset, entry.length)
+
+
+def ensure_partitions(months_ahead=3):
+    """Create monthly chat_messages partitions on PostgreSQL; returns names created"""
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'chat_messages'")
+        row = cursor.fetchone()
+        if not row or row[0] != 'p':
+            return []
+
+        created = []
+        month = timezone.now().date().replace(day=1)
+        for _ in range(months_ahead + 1):
+            following = (month + timedelta(days=32)).replace(day=1)
+            name = f'chat_messages_{month:%Y_%m}'
+            cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [name])
+            if cursor.fetchone() is None:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF chat_messages '
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+                )
+                created.append(name)
+            month = following
+    return created
@@ -0,0 +1,139 @@
+"""
+Micro-benchmarks for the pure computation in services.py.
+
+Runs against unsaved, in-memory model instances, so no database is needed.
+For each case it reports ops/sec (best of several timed rounds) and the
+peak bytes allocated by a single call (tracemalloc). Runs can be appended
+to a JSON-lines history file; each run is compared with the previous one
+so hot-path changes to the agents come with numbers.
+
+    python benchmarks/agents.py
+    python benchmarks/agents.py --history bench_history.jsonl
+    python benchmarks/agents.py -k emi --min-time 1
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+
+from chatbot.kyc import KYCService, verhoeff_valid  # noqa: E402
+from chatbot.models import Customer, LoanApplication  # noqa: E402
+from chatbot.services import SalesAgent, SanctionAgent  # noqa: E402
+
+
+def make_application():
+    customer = Customer(
+        id=1, phone='9876543210', name='Bench User', email='bench@loanwise.com',
+        pre_approved_limit=Decimal('500000'), pre_approved_rate=Decimal('12.50'),
+    )
+    return LoanApplication(
+        customer=customer, application_id='APPBENCH0001', requested_amount=Decimal('250000'),
+        tenure_months=24, interest_rate=Decimal('12.50'), emi=Decimal('11827'),
+        status='approved', created_at=timezone.now(),
+    )
+
+
+def cases():
+    application = make_application()
+    kyc = KYCService(store=None)
+    return {
+        'calculate_emi': lambda: SalesAgent.calculate_emi(250000, 12.5, 24),
+        'generate_emi_options': lambda: SalesAgent.generate_emi_options(Decimal('250000'), Decimal('12.50')),
+        'kyc_validate_valid': lambda: kyc.verify('234567890124', 'ABCPE1234F'),
+        'kyc_validate_invalid': lambda: kyc.verify('123456789012', 'ABCDE1234F'),
+        'verhoeff': lambda: verhoeff_valid('234567890124'),
+        'sanction_letter_html': lambda: SanctionAgent.generate_sanction_letter_html(application),
+    }
+
+
+def measure(func, min_time, rounds):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    # scale so each round takes about min_time / rounds
+    per_call = timer.timeit(number) / number
+    number = max(1, int(min_time / rounds / per_call))
+    best = min(timer.repeat(repeat=rounds, number=number)) / number
+
+    func()  # warm caches before measuring memory
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'ops_per_s': 1 / best, 'us_per_call': best * 1e6, 'peak_bytes_per_call': peak - baseline}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).resolve().parent,
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def load_previous(path):
+    if not path or not os.path.exists(path):
+        return None
+    last = None
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='filter', default='', help='only run cases containing this string')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds of timing per case')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--history', metavar='PATH', help='append results to this JSON-lines file')
+    args = parser.parse_args()
+
+    previous = load_previous(args.history)
+    results = {}
+    print(f"{'case':<24}{'ops/s':>14}{'us/call':>11}{'peak B/call':>13}{'vs prev':>10}")
+    for name, func in cases().items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(func, args.min_time, args.rounds)
+        change = ''
+        if previous and name in previous['results']:
+            before = previous['results'][name]['ops_per_s']
+            change = f"{(result['ops_per_s'] / before - 1) * 100:+.1f}%"
+        print(f"{name:<24}{result['ops_per_s']:>14,.0f}{result['us_per_call']:>11.2f}"
+              f"{result['peak_bytes_per_call']:>13,}{change:>10}")
+
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'results': results,
+            }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Insert throughput on loan_applications with random vs time-ordered IDs.
+
+Inserts --rows applications per scheme, one transaction per --batch rows,
+and reports rows/sec for each scheme. Every scheme runs on top of --preload
+existing rows so the application_id index is already large when the timed
+inserts start. Everything runs in a throwaway test database created from
+the configured one (same engine, migrated) and destroyed afterwards, so
+neither the applications nor the funnel counters they bump are left behind.
+
+    python benchmarks/app_ids.py
+    python benchmarks/app_ids.py --rows 50000 --preload 200000
+
+Random-key inserts touch pages all over the unique index, so the gap
+widens once the index no longer fits in cache. Point DATABASES at Postgres
+for numbers that matter; SQLite shows the trend.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+
+from chatbot.ids import ApplicationIdGenerator  # noqa: E402
+from chatbot.models import Customer, LoanApplication  # noqa: E402
+
+
+BENCH_PHONE = '0000000000'
+
+
+def random_ids():
+    while True:
+        yield f'APP{uuid.uuid4().hex[:17].upper()}'
+
+
+def sequential_ids():
+    generator = ApplicationIdGenerator(node=1)
+    while True:
+        yield generator.next_id()
+
+
+SCHEMES = {'random': random_ids, 'sequential': sequential_ids}
+
+
+def insert(customer, ids, rows, batch):
+    started = time.perf_counter()
+    for offset in range(0, rows, batch):
+        with transaction.atomic():
+            for _ in range(min(batch, rows - offset)):
+                LoanApplication.objects.create(customer=customer, application_id=next(ids))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500, help='rows per transaction')
+    parser.add_argument('--preload', type=int, default=50000, help='rows already in the index')
+    args = parser.parse_args()
+
+    database = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        customer = Customer.objects.create(
+            phone=BENCH_PHONE, name='Bench User', email='bench@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0,
+        )
+        print(f"{'scheme':<12}{'rows':>9}{'seconds':>10}{'rows/s':>12}")
+        for name, scheme in SCHEMES.items():
+            ids = scheme()
+            insert(customer, ids, args.preload, args.batch * 10)
+            elapsed = insert(customer, ids, args.rows, args.batch)
+            print(f"{name:<12}{args.rows:>9}{elapsed:>10.2f}{args.rows / elapsed:>12,.0f}")
+            LoanApplication.objects.filter(customer=customer).delete()
+    finally:
+        connection.creation.destroy_test_db(database, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
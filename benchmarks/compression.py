@@ -0,0 +1,142 @@
+"""
+Response compression and conditional GETs: CPU cost against bytes saved.
+
+Compression: renders a sanction letter response and get_application
+responses of several transcript sizes, then times each encoder/level on
+them (brotli rows only when the Brotli package is installed). "ms" is per
+response, so MB/s is what one worker core can push through the encoder.
+
+Conditional GETs: creates an application with a --messages transcript in
+the configured database and times a full get_application request against
+a revalidation that answers 304 from the ETag. The rows are deleted
+afterwards.
+
+    python benchmarks/compression.py
+    python benchmarks/compression.py --messages 2000 --skip-db
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import timeit
+from decimal import Decimal
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from django.utils.text import compress_string  # noqa: E402
+
+from chatbot.compression import brotli  # noqa: E402
+from chatbot.models import ChatMessage, Customer, LoanApplication  # noqa: E402
+from chatbot.renderers import ORJSONRenderer  # noqa: E402
+from chatbot.services import SanctionAgent  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from json_render import application_response  # noqa: E402
+
+
+BENCH_PHONE = '0000000002'
+BENCH_APPLICATION = 'APPBENCHCOMPRESS1'
+
+ENCODERS = [
+    ('gzip-1', lambda body: gzip.compress(body, compresslevel=1, mtime=0)),
+    ('gzip-6 (django)', lambda body: compress_string(body, max_random_bytes=100)),
+    ('gzip-9', lambda body: gzip.compress(body, compresslevel=9, mtime=0)),
+]
+if brotli is not None:
+    ENCODERS += [
+        (f'br-{quality}', lambda body, quality=quality: brotli.compress(body, quality=quality))
+        for quality in (1, 4, 5, 11)
+    ]
+
+
+def sanction_response():
+    now = timezone.now()
+    customer = Customer(name='Bench User', email='bench@loanwise.com', phone='9876543210')
+    application = LoanApplication(
+        customer=customer, application_id='APPBENCH0001', requested_amount=Decimal('250000'),
+        tenure_months=24, interest_rate=Decimal('12.50'), emi=Decimal('11827'), credit_score=760,
+        monthly_income=Decimal('85000'), foir=Decimal('13.91'), status='approved', created_at=now,
+    )
+    return {
+        'success': True,
+        'letter_html': SanctionAgent.generate_sanction_letter_html(application),
+        'message': '✅ Sanction letter generated successfully!',
+        'stage': 'sanction',
+    }
+
+
+def best(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def compression(messages):
+    renderer = ORJSONRenderer()
+    payloads = [('sanction letter', renderer.render(sanction_response()))]
+    for count in sorted({20, 200, messages}):
+        payloads.append((f'{count} messages', renderer.render(application_response(count))))
+
+    print(f"{'payload':<18}{'encoder':<17}{'bytes':>10}{'ratio':>8}{'ms':>9}{'MB/s':>9}")
+    for name, body in payloads:
+        print(f"{name:<18}{'identity':<17}{len(body):>10,}")
+        for encoder, compress in ENCODERS:
+            size = len(compress(body))
+            number = max(1, 2000000 // len(body))
+            seconds = best(lambda: compress(body), number)
+            print(f'{"":<18}{encoder:<17}{size:>10,}{len(body) / size:>7.1f}x'
+                  f'{seconds * 1e3:>9.3f}{len(body) / seconds / 1e6:>9.0f}')
+
+
+def conditional_get(messages):
+    setup_test_environment()
+    customer, _ = Customer.objects.get_or_create(phone=BENCH_PHONE, defaults={
+        'name': 'Bench User', 'email': 'bench@loanwise.com',
+        'pre_approved_limit': 500000, 'pre_approved_rate': 12.5,
+    })
+    application = LoanApplication.objects.create(customer=customer, application_id=BENCH_APPLICATION)
+    ChatMessage.objects.bulk_create([
+        ChatMessage(application=application, message_type='user', content=f'Question {i} about my loan')
+        for i in range(messages)
+    ])
+    try:
+        client = Client(HTTP_ACCEPT_ENCODING='gzip, br')
+        url = reverse('get_application', args=[BENCH_APPLICATION])
+        full = client.get(url)
+        etag = full.headers['ETag']
+        revalidated = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        print(f'\nget_application, {messages} messages: {full.status_code} with {len(full.content):,} '
+              f'{full.headers.get("Content-Encoding", "identity")} bytes, '
+              f'then {revalidated.status_code} with {len(revalidated.content)}')
+        before = best(lambda: client.get(url), 20)
+        after = best(lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), 20)
+        print(f"{'full ms':>10}{'304 ms':>10}{'speedup':>10}")
+        print(f'{before * 1e3:>10.2f}{after * 1e3:>10.2f}{before / after:>9.1f}x')
+    finally:
+        application.delete()
+        customer.delete()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--skip-db', action='store_true', help='only time the encoders')
+    args = parser.parse_args()
+
+    compression(args.messages)
+    if not args.skip_db:
+        conditional_get(args.messages)
+
+
+if __name__ == '__main__':
+    main()
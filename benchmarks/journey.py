@@ -0,0 +1,206 @@
+"""
+End-to-end load test for the loan journey.
+
+Drives complete journeys (start -> save_new_user_details -> emi -> kyc ->
+eligibility -> sanction) against a running server with N concurrent
+clients. It reports p50/p95/p99 latency per stage, DB queries per stage
+and journeys per second. Query counts come from the Server-Timing header,
+so run the server with METRICS_ENABLED=True and either DEBUG=True or a
+METRICS_TOKEN passed with --metrics-token to get them. All journeys come
+from one IP, so switch off the per-IP rate limits with THROTTLE_ENABLED=False.
+
+    METRICS_ENABLED=True METRICS_TOKEN=bench THROTTLE_ENABLED=False python manage.py runserver --noreload
+    python benchmarks/journey.py --journeys 500 --concurrency 20 --metrics-token bench --save-baseline baseline.json
+    python benchmarks/journey.py --journeys 500 --concurrency 20 --compare baseline.json
+
+With --compare the run exits with status 1 if any stage's p95 latency or
+the overall throughput is worse than the baseline by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+STAGES = ['start', 'save_new_user_details', 'emi', 'kyc', 'eligibility', 'sanction']
+
+SERVER_TIMING_QUERIES = re.compile(r'db;desc="(\d+) queries"')
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = {stage: [] for stage in STAGES}
+        self.queries = {stage: [] for stage in STAGES}
+        self.errors = {stage: 0 for stage in STAGES}
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage, elapsed, response):
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        with self._lock:
+            self.latency[stage].append(elapsed)
+            if match:
+                self.queries[stage].append(int(match.group(1)))
+            if response.status_code >= 400:
+                self.errors[stage] += 1
+
+
+def call(session, base_url, recorder, stage, path, payload):
+    started = time.perf_counter()
+    response = session.post(f'{base_url}/chatbot/api{path}', json=payload, timeout=30)
+    recorder.record(stage, time.perf_counter() - started, response)
+    return response.json() if response.headers.get('Content-Type', '').startswith('application/json') else {}
+
+
+def run_journey(base_url, phone, recorder, local, metrics_token):
+    session = getattr(local, 'session', None)
+    if session is None:
+        session = local.session = requests.Session()
+        if metrics_token:
+            session.headers['Authorization'] = f'Bearer {metrics_token}'
+
+    result = call(session, base_url, recorder, 'start', '/start/', {'phone': phone})
+    app_id = result.get('application_id')
+    if not app_id:
+        return
+    if result.get('is_new_user'):
+        call(session, base_url, recorder, 'save_new_user_details', '/save_new_user_details/', {
+            'application_id': app_id, 'name': 'Bench User', 'email': f'bench{phone}@loanwise.com',
+            'dob': '01/01/1990', 'address': 'Bench Street', 'income': 80000,
+        })
+    call(session, base_url, recorder, 'emi', '/emi/', {
+        'application_id': app_id, 'amount': 100000, 'tenure': 12,
+    })
+    call(session, base_url, recorder, 'kyc', '/kyc/', {
+        'application_id': app_id, 'aadhar': '234567890124', 'pan': 'ABCPE1234F',
+    })
+    result = call(session, base_url, recorder, 'eligibility', '/eligibility/', {
+        'application_id': app_id, 'monthly_income': 80000,
+    })
+    # Credit scores are simulated, so only approved journeys reach sanction
+    if result.get('decision') == 'approved':
+        call(session, base_url, recorder, 'sanction', '/sanction/', {'application_id': app_id})
+    with recorder._lock:
+        recorder.completed += 1
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(recorder, elapsed, args):
+    stages = {}
+    for stage in STAGES:
+        latency = recorder.latency[stage]
+        if not latency:
+            continue
+        queries = recorder.queries[stage]
+        stages[stage] = {
+            'requests': len(latency),
+            'errors': recorder.errors[stage],
+            'p50_ms': percentile(latency, 50) * 1000,
+            'p95_ms': percentile(latency, 95) * 1000,
+            'p99_ms': percentile(latency, 99) * 1000,
+            'mean_queries': statistics.mean(queries) if queries else None,
+        }
+    return {
+        'journeys': recorder.completed,
+        'concurrency': args.concurrency,
+        'elapsed_s': elapsed,
+        'journeys_per_s': recorder.completed / elapsed if elapsed else 0.0,
+        'stages': stages,
+    }
+
+
+def print_report(report):
+    print(f"{report['journeys']} journeys in {report['elapsed_s']:.2f}s "
+          f"({report['journeys_per_s']:.1f} journeys/s, concurrency {report['concurrency']})\n")
+    print(f"{'stage':<24}{'reqs':>7}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for stage, row in report['stages'].items():
+        queries = f"{row['mean_queries']:.1f}" if row['mean_queries'] is not None else '-'
+        print(f"{stage:<24}{row['requests']:>7}{row['errors']:>6}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{queries:>9}")
+
+
+def compare(report, baseline, tolerance):
+    """Return a list of regressions against a saved baseline"""
+    regressions = []
+    if report['journeys_per_s'] < baseline['journeys_per_s'] * (1 - tolerance):
+        regressions.append(
+            f"throughput {report['journeys_per_s']:.1f}/s < baseline {baseline['journeys_per_s']:.1f}/s"
+        )
+    for stage, row in report['stages'].items():
+        base = baseline['stages'].get(stage)
+        if not base:
+            continue
+        if row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {row['p95_ms']:.1f}ms > baseline {base['p95_ms']:.1f}ms")
+        # Compared rounded: some stages branch (e.g. approved vs rejected) so means wobble
+        if (row['mean_queries'] is not None and base['mean_queries'] is not None
+                and round(row['mean_queries']) > round(base['mean_queries'])):
+            regressions.append(
+                f"{stage} queries {row['mean_queries']:.1f} > baseline {base['mean_queries']:.1f}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--journeys', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--metrics-token', default=os.getenv('METRICS_TOKEN', ''),
+                        help='sent as a bearer token so the server adds Server-Timing')
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    local = threading.local()
+    # Fresh 10-digit numbers per run so every journey takes the new-user path
+    phone_base = random.randint(6000000000, 9899999999 - args.journeys)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            pool.submit(run_journey, args.url, str(phone_base + i), recorder, local, args.metrics_token)
+            for i in range(args.journeys)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    report = summarize(recorder, elapsed, args)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nBaseline saved to {args.save_baseline}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print('\nNo regressions against baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+JSON rendering/parsing: DRF's stock JSONRenderer/JSONParser vs the orjson pair.
+
+Builds a get_application response for an application with --messages chat
+messages from unsaved model instances, then times rendering it and parsing
+the result back with each implementation. It also checks that both
+renderers produce identical bytes.
+
+    python benchmarks/json_render.py
+    python benchmarks/json_render.py --messages 2000
+"""
+
+import argparse
+import io
+import os
+import sys
+import timeit
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from chatbot.models import ChatMessage, Customer, LoanApplication  # noqa: E402
+from chatbot.renderers import ORJSONParser, ORJSONRenderer  # noqa: E402
+from chatbot.serializers import ChatMessageSerializer, LoanApplicationSerializer  # noqa: E402
+
+
+def application_response(messages):
+    now = timezone.now()
+    customer = Customer(
+        id=1, phone='9876543210', name='Bench User', email='bench@loanwise.com',
+        pre_approved_limit=Decimal('500000'), pre_approved_rate=Decimal('12.50'),
+    )
+    application = LoanApplication(
+        id=1, customer=customer, application_id='APPBENCH0001', requested_amount=Decimal('250000'),
+        tenure_months=24, interest_rate=Decimal('12.50'), emi=Decimal('11827'), credit_score=760,
+        monthly_income=Decimal('85000'), foir=Decimal('13.91'), status='approved', kyc_verified=True,
+        created_at=now, updated_at=now,
+    )
+    rows = [
+        ChatMessage(
+            id=i, application=application, message_type='sales_agent' if i % 2 else 'user',
+            content='' if i % 2 else f'I want to borrow ₹{250000 + i:,} for 24 months',
+            template=4 if i % 2 else None, params={'emi': f'{11827 + i:,}'} if i % 2 else None,
+            metadata={'credit_score': 760, 'foir': 13.91} if i % 10 == 0 else {},
+            created_at=now + timedelta(seconds=i),
+        )
+        for i in range(messages)
+    ]
+    # The messages relation needs a saved row, so serialize them separately
+    serializer = LoanApplicationSerializer(application)
+    serializer.fields.pop('messages')
+    data = dict(serializer.data)
+    data['messages'] = ChatMessageSerializer(rows, many=True).data
+    # Raw Decimals, as the stage views return them
+    data['customer_offer'] = {'pre_approved_limit': customer.pre_approved_limit,
+                              'pre_approved_rate': customer.pre_approved_rate}
+    return data
+
+
+def best(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--number', type=int, default=200, help='calls per timing round')
+    args = parser.parse_args()
+
+    data = application_response(args.messages)
+    stock, fast = JSONRenderer(), ORJSONRenderer()
+    stock_bytes, fast_bytes = stock.render(data), fast.render(data)
+    print(f'{args.messages} messages, {len(stock_bytes):,} bytes, identical output: {stock_bytes == fast_bytes}\n')
+
+    cases = [
+        ('render', lambda: stock.render(data), lambda: fast.render(data)),
+        ('parse', lambda: JSONParser().parse(io.BytesIO(stock_bytes)),
+         lambda: ORJSONParser().parse(io.BytesIO(fast_bytes))),
+    ]
+    print(f"{'case':<10}{'stock us':>12}{'orjson us':>12}{'speedup':>10}")
+    for name, stock_func, fast_func in cases:
+        before = best(stock_func, args.number)
+        after = best(fast_func, args.number)
+        print(f'{name:<10}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{before / after:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+EMI quote grid: building it cell by cell with SalesAgent.calculate_emi vs
+quotes.compute_grid, the cached lookup, and the size of the payload.
+
+Uses the QUOTE_GRID_* settings and a --limit pre-approved limit at --rate,
+checks that both builds agree, then reports build times and the JSON size
+of plain vs delta-encoded rows (raw and gzipped).
+
+    python benchmarks/quote_grid.py
+    python benchmarks/quote_grid.py --limit 2000000 --rate 11.25
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import timeit
+from decimal import Decimal
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from chatbot import quotes  # noqa: E402
+from chatbot.renderers import ORJSONRenderer  # noqa: E402
+from chatbot.services import SalesAgent  # noqa: E402
+
+
+def per_cell(rate, count):
+    amounts = [settings.QUOTE_GRID_AMOUNT_MIN + settings.QUOTE_GRID_AMOUNT_STEP * i for i in range(count)]
+    return [[SalesAgent.calculate_emi(amount, rate, tenure) for amount in amounts] for tenure in quotes.tenures()]
+
+
+def best(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=500000)
+    parser.add_argument('--rate', type=Decimal, default=Decimal('12.50'))
+    args = parser.parse_args()
+
+    count = quotes.amount_count(args.limit)
+    plain = per_cell(args.rate, count)
+    grid = quotes.compute_grid(args.rate, count)
+    cells = count * len(plain)
+    print(f'{count} amounts x {len(plain)} tenures = {cells:,} cells, '
+          f'identical EMIs: {[quotes.decode_row(row) for row in grid] == plain}\n')
+
+    quotes.emi_grid(args.rate, count)
+    timings = [
+        ('calculate_emi per cell', best(lambda: per_cell(args.rate, count), 5)),
+        ('compute_grid', best(lambda: quotes.compute_grid(args.rate, count), 20)),
+        ('emi_grid (cached)', best(lambda: quotes.emi_grid(args.rate, count), 1000)),
+    ]
+    print(f"{'build':<26}{'ms':>10}")
+    for name, seconds in timings:
+        print(f'{name:<26}{seconds * 1e3:>10.3f}')
+
+    renderer = ORJSONRenderer()
+    print(f"\n{'payload':<26}{'bytes':>10}{'gzip':>10}")
+    for name, rows in [('plain rows', plain), ('delta-encoded rows', grid)]:
+        body = renderer.render(quotes.quote_grid(args.rate, args.limit) | {'emi': rows})
+        print(f'{name:<26}{len(body):>10,}{len(gzip.compress(body)):>10,}')
+
+
+if __name__ == '__main__':
+    main()
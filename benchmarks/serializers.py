@@ -0,0 +1,95 @@
+"""
+get_application serialization: LoanApplicationSerializer vs loan_application_data.
+
+Creates an application with a --messages message transcript in the
+configured database, then times building the response data from a fresh
+query with each path (queries included) and checks that both render to
+identical JSON. The rows are deleted afterwards.
+
+    python benchmarks/serializers.py
+    python benchmarks/serializers.py --messages 5000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'loan_chatbot.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from chatbot.models import ChatMessage, Customer, LoanApplication  # noqa: E402
+from chatbot.serializers import LoanApplicationSerializer, loan_application_data  # noqa: E402
+
+
+BENCH_PHONE = '0000000001'
+BENCH_APPLICATION = 'APPBENCHSERIAL001'
+
+
+def create_transcript(messages):
+    customer, _ = Customer.objects.get_or_create(phone=BENCH_PHONE, defaults={
+        'name': 'Bench User', 'email': 'bench@loanwise.com',
+        'pre_approved_limit': 500000, 'pre_approved_rate': 12.5,
+    })
+    application = LoanApplication.objects.create(
+        customer=customer, application_id=BENCH_APPLICATION, requested_amount=250000, tenure_months=24,
+        interest_rate='12.50', emi='11827.00', credit_score=760, monthly_income=85000, foir='13.91',
+        status='approved', kyc_verified=True,
+    )
+    ChatMessage.objects.bulk_create([
+        ChatMessage(
+            application=application, message_type='sales_agent' if i % 2 else 'user',
+            content='' if i % 2 else f'Question {i} about my loan',
+            template=4 if i % 2 else None, params={'emi': f'{11827 + i:,}'} if i % 2 else None,
+            metadata={'credit_score': 760, 'foir': 13.91} if i % 10 == 0 else {},
+        )
+        for i in range(messages)
+    ])
+    return customer
+
+
+def stock():
+    return LoanApplicationSerializer(LoanApplication.objects.get(application_id=BENCH_APPLICATION)).data
+
+
+def fast():
+    return loan_application_data(
+        LoanApplication.objects.select_related('customer').get(application_id=BENCH_APPLICATION)
+    )
+
+
+def best(func, number, repeat=5):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=20, help='calls per timing round')
+    args = parser.parse_args()
+
+    customer = create_transcript(args.messages)
+    try:
+        renderer = JSONRenderer()
+        stock_bytes, fast_bytes = renderer.render(stock()), renderer.render(fast())
+        print(f'{args.messages} messages, {len(stock_bytes):,} bytes, identical output: {stock_bytes == fast_bytes}\n')
+
+        before = best(stock, args.number)
+        after = best(fast, args.number)
+        print(f"{'serializer ms':>14}{'builder ms':>12}{'speedup':>10}")
+        print(f'{before * 1e3:>14.2f}{after * 1e3:>12.2f}{before / after:>9.1f}x')
+    finally:
+        LoanApplication.objects.filter(application_id=BENCH_APPLICATION).delete()
+        customer.delete()
+
+
+if __name__ == '__main__':
+    main()
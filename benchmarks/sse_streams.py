@@ -0,0 +1,145 @@
+"""
+Load test for the streaming chat endpoint.
+
+Opens many concurrent /chat/stream/ connections against a running ASGI
+server and reports time-to-first-byte, time-to-first-step and total stream
+duration. Each stream gets its own application, created up front through
+/start/ so setup does not skew the streaming numbers.
+
+    uvicorn loan_chatbot.asgi:application --workers 1 --port 8000
+    ulimit -n 20000
+    python benchmarks/sse_streams.py --streams 5000 --url http://127.0.0.1:8000
+
+Only the standard library is used so it can run from any box.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+STEPS = [
+    {'name': 'Load Test', 'email': 'load@test.com', 'income': 80000},
+    {'amount': 100000, 'tenure': 12},
+    {'aadhar': '234567890124', 'pan': 'ABCPE1234F'},
+    {'monthly_income': 80000},
+    {},
+]
+
+
+async def http_post(host, port, path, payload, on_chunk=None):
+    """Minimal HTTP/1.1 POST; returns (status, body bytes)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode()
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+        f'Connection: close\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    chunks = []
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            break
+        if on_chunk:
+            on_chunk(chunk)
+        chunks.append(chunk)
+    writer.close()
+    raw = b''.join(chunks)
+    return status, raw.split(b'\r\n\r\n', 1)[-1]
+
+
+async def create_application(host, port, phone):
+    status, body = await http_post(host, port, '/chatbot/api/start/', {'phone': phone})
+    if status != 201:
+        raise RuntimeError(f'start failed for {phone}: {status}')
+    return json.loads(body)['application_id']
+
+
+async def run_stream(host, port, app_id, results):
+    started = time.perf_counter()
+    marks = {}
+
+    def on_chunk(chunk):
+        now = time.perf_counter()
+        marks.setdefault('first_byte', now)
+        if b'event: step' in chunk:
+            marks.setdefault('first_step', now)
+
+    try:
+        status, _ = await http_post(
+            host, port, '/chatbot/api/chat/stream/',
+            {'application_id': app_id, 'steps': STEPS}, on_chunk
+        )
+    except OSError as e:
+        results['errors'].append(str(e))
+        return
+    finished = time.perf_counter()
+    if status != 200:
+        results['errors'].append(f'HTTP {status}')
+        return
+    results['ttfb'].append(marks.get('first_byte', finished) - started)
+    results['first_step'].append(marks.get('first_step', finished) - started)
+    results['total'].append(finished - started)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def summarize(name, values):
+    if not values:
+        return f'{name:<12} no samples'
+    return (
+        f'{name:<12} p50={percentile(values, 50) * 1000:8.1f}ms '
+        f'p95={percentile(values, 95) * 1000:8.1f}ms '
+        f'p99={percentile(values, 99) * 1000:8.1f}ms '
+        f'mean={statistics.mean(values) * 1000:8.1f}ms'
+    )
+
+
+async def main(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+    semaphore = asyncio.Semaphore(args.setup_concurrency)
+
+    async def setup(i):
+        async with semaphore:
+            return await create_application(host, port, str(args.phone_base + i))
+
+    print(f'Creating {args.streams} applications...')
+    app_ids = await asyncio.gather(*(setup(i) for i in range(args.streams)))
+
+    results = {'ttfb': [], 'first_step': [], 'total': [], 'errors': []}
+    print(f'Opening {args.streams} concurrent streams...')
+    started = time.perf_counter()
+    await asyncio.gather(*(run_stream(host, port, app_id, results) for app_id in app_ids))
+    elapsed = time.perf_counter() - started
+
+    print(f'\n{len(results["total"])}/{args.streams} streams completed in {elapsed:.2f}s '
+          f'({len(results["total"]) / elapsed:.1f} streams/s), {len(results["errors"])} errors')
+    print(summarize('ttfb', results['ttfb']))
+    print(summarize('first step', results['first_step']))
+    print(summarize('total', results['total']))
+    if results['errors']:
+        print('first errors:', results['errors'][:5])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--streams', type=int, default=5000)
+    parser.add_argument('--setup-concurrency', type=int, default=100)
+    parser.add_argument('--phone-base', type=int, default=7000000000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core import checks
+
+
+# Cache-backed state that every worker has to see
+SHARED_CACHE_FEATURES = [
+    'Idempotency-Key locks and stored responses',
+    'conversation state',
+    'the profiling switch',
+    'phone filter markers for customers created by other workers',
+]
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    """Warn when the default cache is per-process outside development"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend.endswith(('LocMemCache', 'DummyCache')):
+        return [checks.Warning(
+            f'The default cache ({backend.rsplit(".", 1)[-1]}) is not shared between worker processes.',
+            hint=f'Set CACHE_URL to a Redis server; {", ".join(SHARED_CACHE_FEATURES)} rely on a shared cache.',
+            id='chatbot.W001',
+        )]
+    return []
@@ -0,0 +1,96 @@
+"""
+Negotiated response compression (brotli or gzip).
+
+Replaces django.middleware.gzip.GZipMiddleware for the API: picks the
+encoding from Accept-Encoding q-values (brotli first when the client ranks
+them equally and the Brotli package is installed), leaves bodies smaller
+than COMPRESSION_MIN_SIZE alone, and only compresses text-like content
+types. Server-Sent Event streams are never compressed, since a compressor
+would hold events back until its buffer fills.
+
+gzip goes through Django's compress_string, which pads the header with
+random bytes against BREACH. Brotli has no such padding, so HTML pages
+(the only responses that embed a CSRF token) stay on gzip.
+"""
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/javascript', 'text/javascript', 'image/svg+xml',
+)
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header"""
+    encodings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding] = q
+    return encodings
+
+
+def choose_encoding(header, html=False):
+    """'br', 'gzip' or None for a request's Accept-Encoding header"""
+    encodings = accepted_encodings(header)
+    wildcard = encodings.get('*', 0.0)
+    candidates = ['gzip'] if html or brotli is None else ['br', 'gzip']
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = encodings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), content_type == 'text/html')
+        if encoding is None:
+            return response
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # The compressed bytes differ from the identity ones; a weak ETag still matches If-None-Match
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
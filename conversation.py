@@ -0,0 +1,175 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status as http_status
+from rest_framework.response import Response
+
+from .models import LoanApplication
+from .metrics import record_cache
+
+
+STATUSES = [code for code, _ in LoanApplication.STATUS_CHOICES]
+STATUS_LABELS = dict(LoanApplication.STATUS_CHOICES)
+STATUS_INDEX = {code: i for i, code in enumerate(STATUSES)}
+
+# Older rows were saved with statuses that are not in STATUS_CHOICES
+LEGACY_STATUSES = {'emi': 'pre_offer'}
+
+TRANSITIONS = {
+    'initiated': {'pre_offer', 'new_user_details'},
+    'new_user_details': {'pre_offer'},
+    'pre_offer': {'emi_preview'},
+    'emi_preview': {'emi_preview', 'kyc_pending', 'kyc_done'},
+    'kyc_pending': {'kyc_done'},
+    'kyc_done': {'eligibility_check', 'approved', 'conditional', 'rejected'},
+    'eligibility_check': {'approved', 'conditional', 'rejected'},
+    'approved': {'sanctioned'},
+    'conditional': set(),
+    'rejected': set(),
+    'sanctioned': set(),
+}
+
+# Statuses each stage action can move an application into
+ACTION_TARGETS = {
+    'details': {'pre_offer'},
+    'emi': {'emi_preview'},
+    'kyc': {'kyc_done'},
+    'eligibility': {'approved', 'conditional', 'rejected'},
+    'sanction': {'sanctioned'},
+}
+
+# Stage the UI should show for an application in each status
+STAGE_FOR_STATUS = {
+    'initiated': 'pre_offer',
+    'new_user_details': 'new_user_details',
+    'pre_offer': 'emi',
+    'emi_preview': 'kyc',
+    'kyc_pending': 'kyc',
+    'kyc_done': 'eligibility',
+    'eligibility_check': 'eligibility',
+    'approved': 'sanction',
+    'conditional': 'pre_offer',
+    'rejected': 'pre_offer',
+    'sanctioned': 'sanction',
+}
+
+
+def normalize_status(status):
+    return LEGACY_STATUSES.get(status, status)
+
+
+def can_transition(current, new):
+    return new in TRANSITIONS.get(normalize_status(current), ())
+
+
+class ConversationState:
+    """Compact per-application state kept in the cache.
+
+    Stored as a packed (status index, customer id) tuple so a stage request
+    can be validated without loading the LoanApplication row.
+    """
+
+    __slots__ = ('application_id', 'status', 'customer_id')
+
+    def __init__(self, application_id, status, customer_id):
+        self.application_id = application_id
+        self.status = normalize_status(status)
+        self.customer_id = customer_id
+
+    @staticmethod
+    def cache_key(application_id):
+        return f'conversation:{application_id}'
+
+    def pack(self):
+        return (STATUS_INDEX[self.status], self.customer_id)
+
+    @classmethod
+    def unpack(cls, application_id, packed):
+        status_index, customer_id = packed
+        return cls(application_id, STATUSES[status_index], customer_id)
+
+    @property
+    def stage(self):
+        return STAGE_FOR_STATUS.get(self.status, 'pre_offer')
+
+    def allows(self, action):
+        return bool(TRANSITIONS.get(self.status, set()) & ACTION_TARGETS[action])
+
+    def save(self):
+        if self.status in STATUS_INDEX:
+            cache.set(self.cache_key(self.application_id), self.pack(), settings.CONVERSATION_STATE_TTL)
+
+
+def load_state(application_id, refresh=False):
+    """Return the ConversationState for an application, or None if it does not exist
+
+    With refresh=True the status is read from the database even when cached.
+    """
+    if not application_id:
+        return None
+    if not refresh:
+        packed = cache.get(ConversationState.cache_key(application_id))
+        record_cache('conversation_state', packed is not None)
+        if packed is not None:
+            return ConversationState.unpack(application_id, packed)
+
+    row = LoanApplication.objects.filter(application_id=application_id).values_list(
+        'status', 'customer_id'
+    ).first()
+    if row is None:
+        return None
+    state = ConversationState(application_id, *row)
+    state.save()
+    return state
+
+
+def guard(application_id, action):
+    """Validate a stage action against the cached state.
+
+    A rejection is only returned after the status has been re-read from the
+    database. Returns (state, None) when the action is allowed, otherwise
+    (state, error Response) so the view can return early.
+    """
+    state = load_state(application_id)
+    if state is not None and not state.allows(action):
+        # The cached state may be stale, e.g. another worker with its own cache advanced it
+        state = load_state(application_id, refresh=True)
+    if state is None:
+        return None, Response({'error': 'Application not found'}, status=http_status.HTTP_404_NOT_FOUND)
+    if not state.allows(action):
+        return state, _conflict(state, action)
+    return state, None
+
+
+def confirm(application, action):
+    """Re-check an action guard() allowed against the freshly loaded row.
+
+    guard() can allow an action on a stale cached state, so stage views call
+    this once they have the row. Returns None or the 409 Response.
+    """
+    state = ConversationState(application.application_id, application.status, application.customer_id)
+    if state.allows(action):
+        return None
+    state.save()
+    return _conflict(state, action)
+
+
+def _conflict(state, action):
+    return Response(
+        {
+            'error': f'Cannot process {action} while the application is '
+                     f'{STATUS_LABELS.get(state.status, state.status)}',
+            'status': state.status,
+            'stage': state.stage
+        },
+        status=http_status.HTTP_409_CONFLICT
+    )
+
+
+def sync_state(sender, instance, **kwargs):
+    """post_save receiver keeping the cached state in step with the row"""
+    ConversationState(instance.application_id, instance.status, instance.customer_id).save()
+
+
+def drop_state(sender, instance, **kwargs):
+    """post_delete receiver"""
+    cache.delete(ConversationState.cache_key(instance.application_id))
@@ -0,0 +1,210 @@
+"""
+Daily loan-funnel rollups for the ops dashboard.
+
+An application is counted once per funnel stage it ever reaches, under the
+day it was created (a daily cohort). Statuses map onto a rank in FUNNEL and
+FunnelProgress records the furthest rank counted so far for each
+application. It is a table of its own, written only here, so a
+LoanApplication.save() from a stale instance can never lower it. Moving
+from rank r to a higher rank s adds one to each stage in between, so
+skipping a stage (kyc_done straight to sanctioned, say) still counts it.
+Falling back to a lower rank takes nothing away.
+
+`record_transition` is a post_save receiver. It locks the progress row,
+raises it and bumps the matching FunnelDaily rows in one transaction.
+Status changes that bypass save() (queryset update(), raw SQL) are picked
+up by `rebuild`, which first raises progress to match the status the same
+way and then recounts the days from it. The rebuild_funnel command runs it
+periodically; migration 0009 ran the same count over all existing
+applications.
+
+Both take the progress locks before the rollup row locks, and `rebuild`
+holds every rollup row of its days while it recounts. A live transition
+therefore lands either before the recount, which then includes it, or
+after it, as +1 on the recounted row. It is never lost or counted twice.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import FunnelDaily, FunnelProgress, LoanApplication
+
+
+FUNNEL = ['initiated', 'emi_preview', 'kyc_done', 'approved', 'sanctioned']
+
+# Furthest funnel stage each status implies
+STAGE_RANK = {
+    'initiated': 0,
+    'new_user_details': 0,
+    'pre_offer': 0,
+    'emi': 0,
+    'emi_preview': 1,
+    'kyc_pending': 1,
+    'kyc_done': 2,
+    'eligibility_check': 2,
+    'conditional': 2,
+    'rejected': 2,
+    'approved': 3,
+    'sanctioned': 4,
+}
+
+AMOUNT_STAGE = 'emi_preview'
+
+
+def cohort_day(created_at):
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def _bump(day, stage, amount=None):
+    values = {'count': F('count') + 1}
+    if amount is not None:
+        values.update(amount_sum=F('amount_sum') + amount, amount_count=F('amount_count') + 1)
+    if FunnelDaily.objects.filter(day=day, stage=stage).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            FunnelDaily.objects.create(
+                day=day, stage=stage, count=1,
+                amount_sum=amount or 0, amount_count=0 if amount is None else 1,
+            )
+    except IntegrityError:
+        # Another worker created the row first
+        FunnelDaily.objects.filter(day=day, stage=stage).update(**values)
+
+
+def record_transition(sender, instance, created, **kwargs):
+    """post_save receiver adding newly reached funnel stages to the rollups"""
+    rank = STAGE_RANK.get(instance.status, 0)
+    with transaction.atomic():
+        previous_rank = _locked_rank(instance.pk)
+        if previous_rank is None:
+            try:
+                with transaction.atomic():
+                    FunnelProgress.objects.create(application_id=instance.pk, rank=rank)
+                previous_rank = -1
+            except IntegrityError:
+                # Another worker (or a rebuild) created it first
+                previous_rank = _locked_rank(instance.pk)
+                if rank <= previous_rank:
+                    return
+                FunnelProgress.objects.filter(application_id=instance.pk).update(rank=rank)
+        elif rank <= previous_rank:
+            return
+        else:
+            FunnelProgress.objects.filter(application_id=instance.pk).update(rank=rank)
+
+        day = cohort_day(instance.created_at)
+        amount = instance.requested_amount
+        for stage in FUNNEL[previous_rank + 1:rank + 1]:
+            _bump(day, stage, Decimal(amount) if stage == AMOUNT_STAGE and amount is not None else None)
+
+
+def _locked_rank(application_pk):
+    return FunnelProgress.objects.select_for_update().filter(
+        application_id=application_pk
+    ).values_list('rank', flat=True).first()
+
+
+def _cohort_range(start, end):
+    tz = timezone.get_current_timezone()
+    begin = timezone.make_aware(datetime.combine(start, time.min), tz)
+    finish = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+    return LoanApplication.objects.filter(created_at__gte=begin, created_at__lt=finish)
+
+
+def rebuild(start, end):
+    """Recompute the rollups for cohort days start..end (inclusive) from loan_applications"""
+    tz = timezone.get_current_timezone()
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    # Every row exists before the recount, so live transitions update (and wait on) a locked row
+    FunnelDaily.objects.bulk_create(
+        [FunnelDaily(day=day, stage=stage) for day in days for stage in FUNNEL], ignore_conflicts=True
+    )
+
+    # Applications saved without the receiver (bulk_create, raw SQL) have no progress yet
+    FunnelProgress.objects.bulk_create([
+        FunnelProgress(application_id=pk, rank=-1)
+        for pk in _cohort_range(start, end).filter(funnel_progress__isnull=True).values_list('pk', flat=True)
+    ], ignore_conflicts=True)
+
+    with transaction.atomic():
+        progress = FunnelProgress.objects.filter(application__in=_cohort_range(start, end))
+        # Every application has at least been initiated, whatever its status
+        progress.filter(rank__lt=0).update(rank=0)
+        for rank in range(1, len(FUNNEL)):
+            statuses = [status for status, status_rank in STAGE_RANK.items() if status_rank == rank]
+            progress.filter(application__status__in=statuses, rank__lt=rank).update(rank=rank)
+        rows = {
+            (row.day, row.stage): row
+            for row in FunnelDaily.objects.select_for_update().filter(day__gte=start, day__lte=end)
+        }
+
+        for day in days:
+            begin = timezone.make_aware(datetime.combine(day, time.min), tz)
+            applications = LoanApplication.objects.filter(
+                created_at__gte=begin, created_at__lt=begin + timedelta(days=1)
+            )
+            counts = applications.aggregate(**{
+                stage: Count('id', filter=Q(funnel_progress__rank__gte=rank)) for rank, stage in enumerate(FUNNEL)
+            })
+            amounts = applications.filter(
+                funnel_progress__rank__gte=FUNNEL.index(AMOUNT_STAGE), requested_amount__isnull=False,
+            ).aggregate(total=Sum('requested_amount'), n=Count('id'))
+            for stage in FUNNEL:
+                row = rows[day, stage]
+                row.count = counts[stage]
+                if stage == AMOUNT_STAGE:
+                    row.amount_sum, row.amount_count = amounts['total'] or 0, amounts['n']
+
+        FunnelDaily.objects.bulk_update(rows.values(), ['count', 'amount_sum', 'amount_count'])
+        FunnelDaily.objects.filter(day__gte=start, day__lte=end, count=0).delete()
+    return sum(1 for row in rows.values() if row.count)
+
+
+def _summarize(counts, amount_sum, amount_count):
+    conversion = {}
+    for previous, stage in zip(FUNNEL, FUNNEL[1:]):
+        conversion[stage] = round(counts[stage] / counts[previous], 4) if counts[previous] else None
+    return {
+        'stages': counts,
+        'conversion': conversion,
+        'approval_rate': round(counts['approved'] / counts['kyc_done'], 4) if counts['kyc_done'] else None,
+        'avg_requested_amount': round(amount_sum / amount_count, 2) if amount_count else None,
+    }
+
+
+def dashboard(days):
+    """Per-day and overall funnel figures for the last `days` cohort days, from the rollups only"""
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    by_day = {}
+    for day, stage, count, amount_sum, amount_count in FunnelDaily.objects.filter(
+        day__gte=start, day__lte=end
+    ).values_list('day', 'stage', 'count', 'amount_sum', 'amount_count'):
+        entry = by_day.setdefault(day, [{s: 0 for s in FUNNEL}, Decimal(0), 0])
+        if stage in entry[0]:
+            entry[0][stage] = count
+        if stage == AMOUNT_STAGE:
+            entry[1] += amount_sum
+            entry[2] += amount_count
+
+    totals = [{s: 0 for s in FUNNEL}, Decimal(0), 0]
+    rows = []
+    for day in sorted(by_day):
+        counts, amount_sum, amount_count = by_day[day]
+        for stage in FUNNEL:
+            totals[0][stage] += counts[stage]
+        totals[1] += amount_sum
+        totals[2] += amount_count
+        rows.append({'date': day.isoformat(), **_summarize(counts, amount_sum, amount_count)})
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'funnel': FUNNEL,
+        'totals': _summarize(*totals),
+        'days': rows,
+    }
@@ -0,0 +1,86 @@
+import hashlib
+import hmac
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import record_cache
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def _body_hash(request):
+    # Keyed, since bodies carry Aadhaar/PAN and a plain hash could be brute-forced
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hmac.new(settings.SECRET_KEY.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _replay(stored, body_hash):
+    stored_hash, status_code, data = stored
+    if stored_hash != body_hash:
+        return Response(
+            {'error': 'Idempotency-Key was already used with a different request body'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(data, status=status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key.
+
+    The first response for a key is kept in the cache for IDEMPOTENCY_TTL
+    seconds. Retries with the same key and body are answered from there
+    without touching the database or the agents. Requests without the
+    header are processed as usual.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(HEADER, '').strip()
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {'error': 'Idempotency-Key must be at most 255 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = f'idempotency:{request.path}:{hashlib.sha256(key.encode()).hexdigest()}'
+        lock_key = cache_key + ':lock'
+        body_hash = _body_hash(request)
+
+        stored = cache.get(cache_key)
+        record_cache('idempotency', stored is not None)
+        if stored is not None:
+            return _replay(stored, body_hash)
+
+        if not cache.add(lock_key, body_hash, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return Response(
+                {'error': 'A request with this Idempotency-Key is already in progress'},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            # The first request may have stored its response and released the lock just now
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return _replay(stored, body_hash)
+            response = view(request, *args, **kwargs)
+            # Server errors are not stored so the client can retry them
+            if response.status_code < 500:
+                cache.set(
+                    cache_key,
+                    (body_hash, response.status_code, response.data),
+                    settings.IDEMPOTENCY_TTL
+                )
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
@@ -0,0 +1,244 @@
+import re
+import hmac
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .metrics import record_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Aadhaar: 12 digits, never starting with 0 or 1
+AADHAR_RE = re.compile(r'^[2-9][0-9]{11}$')
+
+# PAN: AAAAA9999A, 4th character is the holder type (P = individual)
+PAN_RE = re.compile(r'^[A-Z]{3}[ABCFGHJLPT][A-Z][0-9]{4}[A-Z]$')
+
+# Verhoeff tables (dihedral group D5)
+VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+def verhoeff_valid(number):
+    """Check a digit string against its trailing Verhoeff check digit"""
+    c = 0
+    for i, ch in enumerate(reversed(number)):
+        c = VERHOEFF_D[c][VERHOEFF_P[i % 8][ord(ch) - 48]]
+    return c == 0
+
+
+def validate_aadhar(aadhar, pan):
+    """Aadhaar format and Verhoeff checksum"""
+    if not AADHAR_RE.match(aadhar):
+        return 'Aadhaar must be 12 digits and cannot start with 0 or 1.'
+    if not verhoeff_valid(aadhar):
+        return 'Aadhaar checksum is invalid.'
+    return None
+
+
+def validate_pan(aadhar, pan):
+    """PAN structure for an individual holder"""
+    if not PAN_RE.match(pan):
+        return 'PAN must be in the format ABCDE1234F.'
+    if pan[3] != 'P':
+        return 'PAN must belong to an individual (4th character "P").'
+    return None
+
+
+DEFAULT_VALIDATORS = [validate_aadhar, validate_pan]
+
+
+class KYCProvider:
+    """Remote verification provider. The base class accepts everything."""
+
+    source = 'local'
+
+    def verify(self, aadhar, pan):
+        """Return (is_valid, error_message)"""
+        return True, None
+
+    def verify_many(self, pairs):
+        return [self.verify(aadhar, pan) for aadhar, pan in pairs]
+
+
+class HTTPKYCProvider(KYCProvider):
+    """Verifies documents against a JSON HTTP endpoint over a pooled session"""
+
+    source = 'remote'
+
+    def __init__(self, url, api_key='', timeout=5, pool_size=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+
+    def verify(self, aadhar, pan):
+        try:
+            response = self.session.post(
+                self.url, json={'aadhar': aadhar, 'pan': pan}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logger.warning('KYC provider request failed: %s', e)
+            return False, 'KYC service is unavailable, please try again.'
+        if data.get('verified'):
+            return True, None
+        return False, data.get('message') or 'Documents could not be verified.'
+
+    def verify_many(self, pairs):
+        if len(pairs) <= 1:
+            return [self.verify(aadhar, pan) for aadhar, pan in pairs]
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(pairs))) as pool:
+            return list(pool.map(lambda pair: self.verify(*pair), pairs))
+
+
+class KYCResultStore:
+    """Caches verification results under a salted hash of the documents.
+
+    Only the HMAC of the Aadhaar/PAN pair is used as the key and the stored
+    value holds no identifiers, so the cache never contains raw documents.
+    """
+
+    prefix = 'kyc:result:'
+
+    def __init__(self, salt, ttl):
+        self.salt = salt.encode() if isinstance(salt, str) else salt
+        self.ttl = ttl
+
+    def key(self, aadhar, pan):
+        digest = hmac.new(self.salt, f'{aadhar}|{pan}'.encode(), hashlib.sha256).hexdigest()
+        return self.prefix + digest
+
+    def get_many(self, keys):
+        if not self.ttl:
+            return {}
+        found = cache.get_many(keys)
+        record_cache('kyc_result', True, len(found))
+        record_cache('kyc_result', False, len(keys) - len(found))
+        return found
+
+    def set(self, key, result):
+        if self.ttl:
+            cache.set(key, result, self.ttl)
+
+    def revoke(self, aadhar, pan):
+        """Drop a cached result so the next verification runs in full"""
+        aadhar, pan = KYCService.normalize(aadhar, pan)
+        cache.delete(self.key(aadhar, pan))
+
+
+class KYCService:
+    """Runs local validators first and only sends passing documents to the provider"""
+
+    def __init__(self, validators=None, provider=None, store=None):
+        self.validators = validators if validators is not None else DEFAULT_VALIDATORS
+        self.provider = provider or KYCProvider()
+        self.store = store
+
+    @staticmethod
+    def normalize(aadhar, pan):
+        return (aadhar or '').strip().replace(' ', ''), (pan or '').strip().upper()
+
+    def validate_local(self, aadhar, pan):
+        errors = []
+        for validator in self.validators:
+            error = validator(aadhar, pan)
+            if error:
+                errors.append(error)
+        return errors
+
+    def verify(self, aadhar, pan):
+        """Verify one Aadhaar/PAN pair"""
+        return self.verify_many([(aadhar, pan)])[0]
+
+    def verify_many(self, pairs):
+        """Verify a batch of Aadhaar/PAN pairs, one result dict per pair"""
+        pairs = [self.normalize(aadhar, pan) for aadhar, pan in pairs]
+        keys = [self.store.key(aadhar, pan) for aadhar, pan in pairs] if self.store else []
+        cached = self.store.get_many(keys) if self.store else {}
+
+        results = []
+        local = []
+        remote = []
+        for i, (aadhar, pan) in enumerate(pairs):
+            if keys and keys[i] in cached:
+                results.append(dict(cached[keys[i]], cached=True))
+                continue
+            errors = self.validate_local(aadhar, pan)
+            result = {'valid': not errors, 'errors': errors, 'source': 'local', 'cached': False}
+            results.append(result)
+            if errors:
+                local.append((i, result))
+            else:
+                remote.append((i, result, aadhar, pan))
+
+        if remote:
+            outcomes = self.provider.verify_many([(a, p) for _, _, a, p in remote])
+            for (i, result, _, _), (is_valid, error) in zip(remote, outcomes):
+                result['valid'] = is_valid
+                result['source'] = self.provider.source
+                if error:
+                    result['errors'].append(error)
+
+        if self.store:
+            # Remote failures may be transient, so only cache settled outcomes
+            for i, result in local + [(i, r) for i, r, _, _ in remote if r['valid']]:
+                self.store.set(keys[i], {k: v for k, v in result.items() if k != 'cached'})
+        return results
+
+
+_service = None
+
+
+def get_kyc_service():
+    """Build the KYC service from settings once per process"""
+    global _service
+    if _service is None:
+        validators = [
+            import_string(path) for path in getattr(settings, 'KYC_VALIDATORS', [])
+        ] or None
+        provider = None
+        provider_path = getattr(settings, 'KYC_PROVIDER', '')
+        if provider_path:
+            provider = import_string(provider_path)(**getattr(settings, 'KYC_PROVIDER_OPTIONS', {}))
+        store = KYCResultStore(
+            getattr(settings, 'KYC_RESULT_SALT', settings.SECRET_KEY),
+            getattr(settings, 'KYC_RESULT_TTL', 0),
+        )
+        _service = KYCService(validators=validators, provider=provider, store=store)
+    return _service
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.archive import archive_transcripts, ensure_partitions
+
+
+class Command(BaseCommand):
+    help = 'Move chat transcripts of old sanctioned/rejected applications into compressed cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='archive applications untouched for this many days')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, help='stop after this many applications')
+        parser.add_argument(
+            '--partitions', type=int, default=3, metavar='MONTHS',
+            help='on PostgreSQL, create chat_messages partitions this many months ahead'
+        )
+
+    def handle(self, *args, **options):
+        for name in ensure_partitions(options['partitions']):
+            self.stdout.write(f'Created partition {name}')
+        applications, messages = archive_transcripts(
+            days=options['days'], batch_size=options['batch_size'], limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {messages} messages from {applications} applications'
+        ))
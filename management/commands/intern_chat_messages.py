@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from chatbot.message_templates import intern
+from chatbot.models import ChatMessage
+
+
+def stored_bytes(content, template, params):
+    size = len(content.encode())
+    if template is not None:
+        size += 2
+    if params:
+        size += len(json.dumps(params, ensure_ascii=False).encode())
+    return size
+
+
+def relation_size():
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size('chat_messages')")
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Convert stored chat message texts to template ids and report the size reduction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+
+    def handle(self, *args, **options):
+        table_before = relation_size()
+        rows = converted = before = after = 0
+        last_id = 0
+        while True:
+            batch = list(
+                ChatMessage.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'content', 'template', 'params')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            updates = []
+            for message_id, content, template, params in batch:
+                rows += 1
+                before += stored_bytes(content, template, params)
+                if template is None and content:
+                    new_template, new_params = intern(content)
+                    if new_template is not None:
+                        content, template, params = '', new_template, new_params
+                        updates.append(ChatMessage(id=message_id, content='', template=template, params=params))
+                after += stored_bytes(content, template, params)
+
+            converted += len(updates)
+            if updates and not options['dry_run']:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_update(updates, ['content', 'template', 'params'])
+
+        saved = before - after
+        self.stdout.write(
+            f"{'Would convert' if options['dry_run'] else 'Converted'} {converted} of {rows} messages"
+        )
+        self.stdout.write(
+            f'Message text: {before:,} bytes -> {after:,} bytes '
+            f'({saved / before * 100 if before else 0:.1f}% smaller)'
+        )
+        if table_before is not None and not options['dry_run']:
+            self.stdout.write(
+                f'chat_messages on disk: {table_before:,} bytes -> {relation_size():,} bytes '
+                '(space is reclaimed after VACUUM)'
+            )
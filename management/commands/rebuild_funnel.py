@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chatbot.funnel import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute funnel rollups from loan_applications for recent cohort days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='number of most recent days to recompute')
+
+    def handle(self, *args, **options):
+        end = timezone.localdate()
+        start = end - timedelta(days=options['days'] - 1)
+        rows = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} funnel rows for {start} to {end}'))
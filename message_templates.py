@@ -0,0 +1,70 @@
+"""
+Interned chat message templates.
+
+Most agent messages are one of a handful of long texts with a few values
+filled in. ChatMessage stores those as a template id plus the filled-in
+values (`params`) and leaves `content` empty; the text is rendered when it
+is read. `intern` works backwards from the rendered text, so callers keep
+passing `content=` and anything that does not match a template exactly is
+stored as-is.
+
+Ids are stored in chat_messages, so an id must never be reused or have its
+text changed. Add new templates under new ids and retire old ones by
+leaving them in place.
+"""
+
+import json
+import re
+
+
+TEMPLATES = {
+    1: 'Great! I found your profile, {name}! 🎉\n\nYou have a pre-approved loan offer:\n'
+       '• Max Limit: ₹{limit}\n• Interest Rate: {rate}% p.a.\n\nHow much would you like to borrow?',
+    2: "I don't have any pre-approved offer for this number. Let me create a new profile for you.",
+    3: 'I want to borrow ₹{amount} for {tenure} months',
+    4: "Perfect! Your monthly EMI will be ₹{emi}. Now let's verify your KYC.",
+    5: "✅ KYC Verification Successful!\n\nYour documents have been verified. Now let's check your eligibility.",
+    6: '❌ KYC Verification Failed!\n\n{reasons}',
+    7: 'My monthly income is ₹{income}',
+    8: '❌ Unfortunately, we cannot approve your loan at this time due to a lower credit score.',
+    9: '⚠️ Your loan is conditionally approved. You may need to provide additional documentation.',
+    10: '✅ Congratulations! Your loan has been APPROVED!',
+    11: "✅ Your Sanction Letter is ready!\n\nWe've generated a professional sanction letter. "
+        'It has been sent to {email}',
+}
+
+FIELD = re.compile(r'\{(\w+)\}')
+
+
+def _compile(text):
+    """Template text -> (literal prefix, anchored regex capturing each field)"""
+    parts = FIELD.split(text)
+    pattern = ''.join(
+        re.escape(part) if i % 2 == 0 else f'(?P<{part}>.*?)' for i, part in enumerate(parts)
+    )
+    return parts[0], re.compile(pattern + r'\Z', re.DOTALL)
+
+
+_MATCHERS = [(template_id, *_compile(text)) for template_id, text in TEMPLATES.items()]
+
+
+def render(template_id, params):
+    return TEMPLATES[template_id].format(**params) if params else TEMPLATES[template_id]
+
+
+def intern(content):
+    """(template_id, params) for content matching a template, else (None, None)"""
+    for template_id, prefix, pattern in _MATCHERS:
+        if not content.startswith(prefix):
+            continue
+        match = pattern.match(content)
+        if match is None:
+            continue
+        params = match.groupdict() or None
+        # Values containing braces or text that only looks like a match must round-trip
+        if render(template_id, params) != content:
+            continue
+        if params and len(json.dumps(params, ensure_ascii=False)) >= len(content):
+            continue
+        return template_id, params
+    return None, None
@@ -0,0 +1,218 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Everything here is a no-op unless METRICS_ENABLED is set: the middleware
+removes itself from the stack and `timed` returns the undecorated function.
+Values are per process, so scrape every worker (or run one per pod).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, Http404
+
+from . import tracing
+
+
+ENABLED = getattr(settings, 'METRICS_ENABLED', False)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                # per-bucket counts (plus +Inf), sum
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(labels, (list(counts), total)) for labels, (counts, total) in self._values.items()]
+        for labelvalues, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                labels = _format_labels(self.labelnames, labelvalues, [('le', le)])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+_latency_buckets = getattr(settings, 'METRICS_LATENCY_BUCKETS', None) or DEFAULT_LATENCY_BUCKETS
+
+request_duration = Histogram(
+    'chatbot_request_duration_seconds', 'Wall time per endpoint',
+    ('endpoint', 'method', 'status'), _latency_buckets
+)
+db_queries = Histogram(
+    'chatbot_request_db_queries', 'Database queries per request',
+    ('endpoint',), getattr(settings, 'METRICS_QUERY_COUNT_BUCKETS', None) or QUERY_COUNT_BUCKETS
+)
+db_duration = Histogram(
+    'chatbot_request_db_duration_seconds', 'Time spent in database queries per request',
+    ('endpoint',), _latency_buckets
+)
+cache_requests = Counter(
+    'chatbot_cache_requests_total', 'Application cache lookups by result', ('cache', 'result')
+)
+agent_duration = Histogram(
+    'chatbot_agent_step_duration_seconds', 'Wall time per agent step',
+    ('agent', 'step'), _latency_buckets
+)
+
+REGISTRY = [request_duration, db_queries, db_duration, cache_requests, agent_duration]
+
+
+def record_cache(cache_name, hit, count=1):
+    """Count application cache hits/misses"""
+    if ENABLED and count:
+        cache_requests.inc(cache_name, 'hit' if hit else 'miss', amount=count)
+
+
+def timed(agent, step):
+    """Decorator timing an agent step into metrics and a tracing span.
+
+    Returns the function untouched when both metrics and tracing are disabled.
+    """
+    def decorator(func):
+        if not ENABLED and not tracing.ENABLED:
+            return func
+        name = f'{agent}.{step}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracing.span(name, **{'agent.name': agent, 'agent.step': step}):
+                    return func(*args, **kwargs)
+            finally:
+                if ENABLED:
+                    agent_duration.observe(time.perf_counter() - started, agent, step)
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+class _QueryTimer:
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def _has_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    return bool(token) and request.headers.get('Authorization') == f'Bearer {token}'
+
+
+class MetricsMiddleware:
+    """Records wall time and DB usage per endpoint.
+
+    Also reports them in a Server-Timing header, which the load-test suite
+    in benchmarks/ reads to get queries per stage. The header is only sent
+    with DEBUG on or to requests carrying the metrics token, since it tells
+    anyone how much DB work an endpoint does.
+    """
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.route if match else 'unmatched'
+        request_duration.observe(elapsed, endpoint, request.method, response.status_code)
+        db_queries.observe(timer.count, endpoint)
+        db_duration.observe(timer.duration, endpoint)
+        if settings.DEBUG or _has_token(request):
+            response['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.2f}, '
+                f'db;desc="{timer.count} queries";dur={timer.duration * 1000:.2f}'
+            )
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    if not ENABLED:
+        raise Http404
+    if getattr(settings, 'METRICS_TOKEN', '') and not _has_token(request):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=15, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('aadhar', models.CharField(blank=True, max_length=12, null=True)),
+                ('pan', models.CharField(blank=True, max_length=10, null=True)),
+                ('pre_approved_limit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('pre_approved_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Customers',
+                'db_table': 'customers',
+            },
+        ),
+        migrations.CreateModel(
+            name='LoanApplication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('application_id', models.CharField(max_length=20, unique=True)),
+                ('requested_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('tenure_months', models.IntegerField(blank=True, null=True)),
+                ('interest_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('emi', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('credit_score', models.IntegerField(blank=True, null=True)),
+                ('monthly_income', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('foir', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('status', models.CharField(choices=[('initiated', 'Initiated'), ('pre_offer', 'Pre-Approved Offer'), ('emi_preview', 'EMI Preview'), ('kyc_pending', 'KYC Pending'), ('kyc_done', 'KYC Done'), ('eligibility_check', 'Eligibility Check'), ('approved', 'Approved'), ('conditional', 'Conditional Approval'), ('rejected', 'Rejected'), ('sanctioned', 'Sanctioned')], default='initiated', max_length=20)),
+                ('kyc_aadhar', models.CharField(blank=True, max_length=12, null=True)),
+                ('kyc_pan', models.CharField(blank=True, max_length=10, null=True)),
+                ('kyc_verified', models.BooleanField(default=False)),
+                ('sanction_letter_path', models.FileField(blank=True, null=True, upload_to='sanction_letters/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='chatbot.customer')),
+            ],
+            options={
+                'db_table': 'loan_applications',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_type', models.CharField(choices=[('user', 'User'), ('master_agent', 'Master Agent'), ('sales_agent', 'Sales Agent'), ('verification_agent', 'Verification Agent'), ('underwriting_agent', 'Underwriting Agent'), ('sanction_agent', 'Sanction Agent')], max_length=25)),
+                ('content', models.TextField()),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chatbot.loanapplication')),
+            ],
+            options={
+                'db_table': 'chat_messages',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanapplication',
+            name='status',
+            field=models.CharField(choices=[('initiated', 'Initiated'), ('new_user_details', 'New User Details'), ('pre_offer', 'Pre-Approved Offer'), ('emi_preview', 'EMI Preview'), ('kyc_pending', 'KYC Pending'), ('kyc_done', 'KYC Done'), ('eligibility_check', 'Eligibility Check'), ('approved', 'Approved'), ('conditional', 'Conditional Approval'), ('rejected', 'Rejected'), ('sanctioned', 'Sanctioned')], default='initiated', max_length=20),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_loanapplication_new_user_details_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTranscript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=100)),
+                ('offset', models.BigIntegerField()),
+                ('length', models.IntegerField()),
+                ('message_count', models.IntegerField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transcript', to='chatbot.loanapplication')),
+            ],
+            options={
+                'db_table': 'chat_transcript_archive',
+            },
+        ),
+    ]
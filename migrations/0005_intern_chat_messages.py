@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:57
+
+from django.db import migrations
+
+from chatbot.message_templates import intern, render
+
+
+BATCH_SIZE = 2000
+
+
+def intern_messages(apps, schema_editor):
+    """Store existing messages that match a template as template id + params"""
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    last_id = 0
+    while True:
+        batch = list(
+            ChatMessage.objects.filter(id__gt=last_id, template__isnull=True).exclude(content='')
+            .order_by('id').values_list('id', 'content')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        updates = []
+        for message_id, content in batch:
+            template, params = intern(content)
+            if template is not None:
+                updates.append(ChatMessage(id=message_id, content='', template=template, params=params))
+        ChatMessage.objects.bulk_update(updates, ['content', 'template', 'params'])
+
+
+def render_messages(apps, schema_editor):
+    """Write the rendered text back into content before the template columns are dropped"""
+    ChatMessage = apps.get_model('chatbot', 'ChatMessage')
+    last_id = 0
+    while True:
+        batch = list(
+            ChatMessage.objects.filter(id__gt=last_id, template__isnull=False)
+            .order_by('id').values_list('id', 'template', 'params')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        ChatMessage.objects.bulk_update([
+            ChatMessage(id=message_id, content=render(template, params), template=None, params=None)
+            for message_id, template, params in batch
+        ], ['content', 'template', 'params'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_chatmessage_template'),
+    ]
+
+    operations = [
+        migrations.RunPython(intern_messages, render_messages),
+    ]
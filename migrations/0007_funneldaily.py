@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-19 06:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0006_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FunnelDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('stage', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('amount_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'funnel_daily',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='funneldaily',
+            constraint=models.UniqueConstraint(fields=('day', 'stage'), name='funnel_daily_day_stage_uniq'),
+        ),
+    ]
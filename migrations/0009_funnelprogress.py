@@ -0,0 +1,76 @@
+# Generated by Django 5.0.1 on 2026-10-19 07:08
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# funnel.FUNNEL, funnel.STAGE_RANK and funnel.AMOUNT_STAGE when this migration was written
+FUNNEL = ['initiated', 'emi_preview', 'kyc_done', 'approved', 'sanctioned']
+STAGE_RANK = {
+    'emi_preview': 1,
+    'kyc_pending': 1,
+    'kyc_done': 2,
+    'eligibility_check': 2,
+    'conditional': 2,
+    'rejected': 2,
+    'approved': 3,
+    'sanctioned': 4,
+}
+AMOUNT_STAGE = 'emi_preview'
+
+
+def backfill_funnel(apps, schema_editor):
+    """Count existing applications into funnel_progress and funnel_daily
+
+    Nothing filled funnel_daily before this, so it is rebuilt from scratch:
+    each application is counted on the local day it was created, up to the
+    stage its current status implies.
+    """
+    LoanApplication = apps.get_model('chatbot', 'LoanApplication')
+    FunnelProgress = apps.get_model('chatbot', 'FunnelProgress')
+    FunnelDaily = apps.get_model('chatbot', 'FunnelDaily')
+
+    progress = []
+    rollups = defaultdict(lambda: {'count': 0, 'amount_sum': Decimal(0), 'amount_count': 0})
+    applications = LoanApplication.objects.values_list('pk', 'status', 'created_at', 'requested_amount')
+    for pk, status, created_at, amount in applications.iterator():
+        rank = STAGE_RANK.get(status, 0)
+        progress.append(FunnelProgress(application_id=pk, rank=rank))
+        day = timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+        for stage in FUNNEL[:rank + 1]:
+            rollup = rollups[day, stage]
+            rollup['count'] += 1
+            if stage == AMOUNT_STAGE and amount is not None:
+                rollup['amount_sum'] += amount
+                rollup['amount_count'] += 1
+
+    FunnelProgress.objects.bulk_create(progress, batch_size=1000)
+    FunnelDaily.objects.all().delete()
+    FunnelDaily.objects.bulk_create([
+        FunnelDaily(day=day, stage=stage, **values) for (day, stage), values in rollups.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FunnelProgress',
+            fields=[
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='funnel_progress', serialize=False, to='chatbot.loanapplication')),
+                ('rank', models.SmallIntegerField()),
+            ],
+            options={
+                'db_table': 'funnel_progress',
+            },
+        ),
+        migrations.RunPython(backfill_funnel, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 
+from .message_templates import intern as intern_template, render as render_template
+
 class Customer(models.Model):
     """Customer model with pre-approved loan offer"""
     phone = models.CharField(max_length=15, unique=True)
@@ -19,12 +21,19 @@ class Customer(models.Model):
     class Meta:
         db_table = 'customers'
         verbose_name_plural = 'Customers'
+        indexes = [
+            # LIKE 'prefix%' index for admin search on PostgreSQL
+            models.Index(fields=['phone'], name='customer_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # Incremental analytics export walks (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='customer_updated_idx'),
+        ]
 
 
 class LoanApplication(models.Model):
     """Loan application tracking"""
     STATUS_CHOICES = [
         ('initiated', 'Initiated'),
+        ('new_user_details', 'New User Details'),
         ('pre_offer', 'Pre-Approved Offer'),
         ('emi_preview', 'EMI Preview'),
         ('kyc_pending', 'KYC Pending'),
@@ -59,6 +68,14 @@ class LoanApplication(models.Model):
     class Meta:
         db_table = 'loan_applications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='loan_app_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='loan_app_status_created_idx'),
+            models.Index(
+                fields=['application_id'], name='loan_app_id_prefix_idx', opclasses=['varchar_pattern_ops']
+            ),
+            models.Index(fields=['updated_at', 'id'], name='loan_app_updated_idx'),
+        ]
 
 
 class ChatMessage(models.Model):
@@ -74,13 +91,93 @@ class ChatMessage(models.Model):
 
     application = models.ForeignKey(LoanApplication, on_delete=models.CASCADE, related_name='messages')
     message_type = models.CharField(max_length=25, choices=MESSAGE_TYPE_CHOICES)
-    content = models.TextField()
+    content = models.TextField(blank=True)  # Empty when the message is stored as a template
+    template = models.PositiveSmallIntegerField(null=True, blank=True)  # Id in message_templates
+    params = models.JSONField(null=True, blank=True)
     metadata = models.JSONField(default=dict, blank=True)  # Store quick replies, form data, etc.
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.application.application_id} - {self.message_type}"
 
+    @property
+    def text(self):
+        """Message text, rendered from its template if it has one"""
+        if self.template is None:
+            return self.content
+        return render_template(self.template, self.params)
+
+    def save(self, *args, **kwargs):
+        if self.template is None and self.content:
+            self.template, self.params = intern_template(self.content)
+            if self.template is not None:
+                self.content = ''
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'chat_messages'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='chat_msg_created_idx'),
+            models.Index(fields=['message_type', 'created_at'], name='chat_msg_type_created_idx'),
+        ]
+
+
+class ArchivedTranscript(models.Model):
+    """Location of an application's archived chat messages in cold storage"""
+    application = models.OneToOneField(
+        LoanApplication, on_delete=models.CASCADE, related_name='archived_transcript'
+    )
+    segment = models.CharField(max_length=100)
+    offset = models.BigIntegerField()
+    length = models.IntegerField()
+    message_count = models.IntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.application_id} -> {self.segment}@{self.offset}"
+
+    class Meta:
+        db_table = 'chat_transcript_archive'
+
+
+class FunnelProgress(models.Model):
+    """Furthest funnel stage (index into funnel.FUNNEL) counted for an application
+
+    Kept out of loan_applications so that saving a LoanApplication, possibly
+    from a stale instance, never writes it back; only funnel.py changes it,
+    with queryset updates under a row lock.
+    """
+    application = models.OneToOneField(
+        LoanApplication, on_delete=models.CASCADE, primary_key=True, related_name='funnel_progress'
+    )
+    rank = models.SmallIntegerField()
+
+    def __str__(self):
+        return f"{self.application_id}: {self.rank}"
+
+    class Meta:
+        db_table = 'funnel_progress'
+
+
+class FunnelDaily(models.Model):
+    """Applications created on `day` that have reached funnel `stage`
+
+    Maintained incrementally from status transitions (see funnel.py) so the
+    ops dashboard never aggregates loan_applications.
+    """
+    day = models.DateField()
+    stage = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+    # Only filled on the emi_preview row, when the amount is first chosen
+    amount_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    amount_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.stage}: {self.count}"
+
+    class Meta:
+        db_table = 'funnel_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'stage'], name='funnel_daily_day_stage_uniq'),
+        ]
@@ -0,0 +1,226 @@
+"""
+Bloom filter of known Customer phone numbers.
+
+`phone_filter.might_exist(phone)` answers False only when the number has
+never been a customer, so callers can skip the customers lookup for
+unknown numbers. A True answer still needs the DB check.
+
+The filter is built on first use with a streaming scan of the customers
+table. After that it catches up at most every PHONE_FILTER_REFRESH seconds
+by re-reading customers whose updated_at is past the newest one it has
+seen, less PHONE_FILTER_LAG seconds. updated_at is set when a row is saved,
+not when its transaction commits, so the overlap picks up rows committed
+late (and phone numbers changed on existing customers) that an id or
+timestamp high-water mark would skip. Re-adding a phone sets no new bits.
+
+Customers saved by this process are added immediately through a post_save
+receiver. Ones saved by other workers are covered until the next catch-up
+by a short-lived cache marker. The bit array is snapshotted to
+PHONE_FILTER_SNAPSHOT so a restart only needs the incremental catch-up.
+Snapshots are stamped with the database they were built from and ignored
+by any other.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Max
+
+from .models import Customer
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    HEADER = struct.Struct('>QIQQ')  # bits, hashes, items, capacity
+
+    def __init__(self, capacity, error_rate, bits=None, hashes=None, count=0, data=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = bits or max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.count = count
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        data, added = self.data, False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not data[position >> 3] & mask:
+                data[position >> 3] |= mask
+                added = True
+        # An item already present (every bit set) is not counted again
+        if added:
+            self.count += 1
+
+    def __contains__(self, item):
+        data = self.data
+        return all(data[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def to_bytes(self):
+        return self.HEADER.pack(self.bits, self.hashes, self.count, self.capacity) + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, raw, error_rate):
+        bits, hashes, count, capacity = cls.HEADER.unpack_from(raw)
+        data = bytearray(raw[cls.HEADER.size:])
+        if len(data) != (bits + 7) // 8:
+            raise ValueError('Truncated bloom filter snapshot')
+        return cls(capacity, error_rate, bits=bits, hashes=hashes, count=count, data=data)
+
+
+class PhoneFilter:
+    SNAPSHOT_MAGIC = b'PHBF3'
+    RECENT_PREFIX = 'phone_filter:recent:'
+
+    def __init__(self):
+        self.bloom = None
+        self.high_water = None  # newest Customer.updated_at added
+        self.last_refresh = 0.0
+        self.last_snapshot = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'PHONE_FILTER_ENABLED', True)
+
+    def _new_bloom(self, capacity=None):
+        return BloomFilter(capacity or settings.PHONE_FILTER_CAPACITY, settings.PHONE_FILTER_ERROR_RATE)
+
+    def might_exist(self, phone):
+        """False means the phone is definitely not a customer"""
+        if not self.enabled or not phone:
+            return True
+        self._ensure_fresh()
+        if phone in self.bloom:
+            return True
+        return cache.get(self.RECENT_PREFIX + phone) is not None
+
+    def add(self, phone):
+        if not self.enabled:
+            return
+        cache.set(self.RECENT_PREFIX + phone, 1, settings.PHONE_FILTER_REFRESH * 2)
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(phone)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self.bloom is not None and now - self.last_refresh < settings.PHONE_FILTER_REFRESH:
+            return
+        with self._lock:
+            if self.bloom is None:
+                if not self._load_snapshot():
+                    self._build()
+            elif now - self.last_refresh >= settings.PHONE_FILTER_REFRESH:
+                self._catch_up()
+            self.last_refresh = now
+            if now - self.last_snapshot >= settings.PHONE_FILTER_SNAPSHOT_INTERVAL:
+                self._save_snapshot()
+                self.last_snapshot = now
+
+    def _scan(self, bloom, since):
+        rows = Customer.objects.order_by('updated_at', 'id').values_list('updated_at', 'phone')
+        if since is not None:
+            rows = rows.filter(updated_at__gte=since - timedelta(seconds=settings.PHONE_FILTER_LAG))
+        high_water = since
+        for updated_at, phone in rows.iterator(chunk_size=5000):
+            bloom.add(phone)
+            high_water = updated_at if high_water is None else max(high_water, updated_at)
+        return high_water
+
+    def _build(self):
+        count = Customer.objects.count()
+        bloom = self._new_bloom(max(settings.PHONE_FILTER_CAPACITY, count * 2))
+        self.high_water = self._scan(bloom, None)
+        self.bloom = bloom
+
+    def _catch_up(self):
+        self.high_water = self._scan(self.bloom, self.high_water)
+        # Past capacity the false-positive rate climbs, so start again bigger
+        if self.bloom.count > self.bloom.capacity:
+            self._build()
+
+    def _save_snapshot(self):
+        path = settings.PHONE_FILTER_SNAPSHOT
+        if not path or self.bloom is None:
+            return
+        high_water = 0 if self.high_water is None else _to_micros(self.high_water)
+        tmp = None
+        try:
+            # A temp file of our own, so workers snapshotting at once never write into each other's
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.SNAPSHOT_MAGIC + _database_identity() + struct.pack('>q', high_water)
+                        + self.bloom.to_bytes())
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning('Phone filter snapshot not saved: %s', e)
+            if tmp is not None and os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _load_snapshot(self):
+        path = settings.PHONE_FILTER_SNAPSHOT
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            identity = _database_identity()
+            if not raw.startswith(self.SNAPSHOT_MAGIC + identity):
+                logger.info('Phone filter snapshot %s is from another database or version; rebuilding', path)
+                return False
+            offset = len(self.SNAPSHOT_MAGIC) + len(identity)
+            (high_water,) = struct.unpack_from('>q', raw, offset)
+            bloom = BloomFilter.from_bytes(raw[offset + 8:], settings.PHONE_FILTER_ERROR_RATE)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning('Phone filter snapshot not loaded: %s', e)
+            return False
+
+        # A snapshot ahead of the table predates a restore of the database; rebuild
+        high_water = _from_micros(high_water) if high_water else None
+        latest = Customer.objects.aggregate(latest=Max('updated_at'))['latest']
+        if high_water is not None and (latest is None or high_water > latest):
+            return False
+        self.bloom = bloom
+        self.high_water = self._scan(bloom, high_water)
+        return True
+
+
+def _database_identity():
+    """Fixed-size digest of the alias and name of the database holding customers"""
+    alias = router.db_for_read(Customer)
+    name = connections[alias].settings_dict['NAME']
+    return hashlib.blake2b(f'{alias}:{name}'.encode(), digest_size=16).digest()
+
+
+def _to_micros(value):
+    return round(value.timestamp() * 1000000)
+
+
+def _from_micros(micros):
+    return datetime.fromtimestamp(0, timezone.utc) + timedelta(microseconds=micros)
+
+
+phone_filter = PhoneFilter()
+
+
+def track_customer(sender, instance, update_fields=None, **kwargs):
+    """post_save receiver adding new and re-numbered customers to the filter"""
+    if update_fields is None or 'phone' in update_fields:
+        phone_filter.add(instance.phone)
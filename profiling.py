@@ -0,0 +1,187 @@
+"""
+Opt-in statistical profiler for the chatbot API.
+
+Staff switch it on from /admin/profiling/ and pick a sample rate. The
+choice is kept in the cache so every worker picks it up within a second,
+without a redeploy. A sampled request to a chatbot.views endpoint gets its
+thread registered with a sampler thread. That thread reads the thread's
+stack every PROFILING_INTERVAL seconds and counts it in collapsed
+("flamegraph.pl") form.
+
+Memory is capped at PROFILING_MAX_STACKS distinct stacks of at most
+PROFILING_MAX_DEPTH frames. Samples that would add a new stack past the cap
+are counted under a single "[truncated]" entry. Counts are per process;
+the download returns the stacks collected by the worker that serves it.
+"""
+
+import random
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseRedirect
+from django.middleware.csrf import get_token
+from django.views.decorators.http import require_http_methods
+
+
+CONFIG_KEY = 'profiling:config'
+CONFIG_REFRESH = 1.0
+TRUNCATED = '[truncated]'
+
+
+class StackSampler:
+    """Samples registered threads' stacks into a bounded collapsed-stack table"""
+
+    def __init__(self, interval, max_stacks, max_depth):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self.stacks = {}
+        self.samples = 0
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, thread_id):
+        with self._lock:
+            self._threads.add(thread_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unregister(self, thread_id):
+        with self._lock:
+            self._threads.discard(thread_id)
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.samples = 0
+
+    def collapsed(self):
+        with self._lock:
+            items = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{code.co_filename.rsplit("/", 1)[-1]}:{code.co_name}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _record(self, collapsed):
+        # New stacks past max_stacks are counted under TRUNCATED so memory stays bounded
+        with self._lock:
+            for stack in collapsed:
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def _run(self):
+        while True:
+            with self._lock:
+                threads = list(self._threads)
+            if not threads:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            self._record([self._collapse(frames[tid]) for tid in threads if tid in frames])
+            time.sleep(self.interval)
+
+
+sampler = StackSampler(
+    getattr(settings, 'PROFILING_INTERVAL', 0.005),
+    getattr(settings, 'PROFILING_MAX_STACKS', 5000),
+    getattr(settings, 'PROFILING_MAX_DEPTH', 64),
+)
+
+
+def get_config():
+    return cache.get(CONFIG_KEY) or {'enabled': False, 'rate': settings.PROFILING_SAMPLE_RATE}
+
+
+class ProfilingMiddleware:
+    """Registers sampled requests to chatbot.views with the stack sampler"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_AVAILABLE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self._config = get_config()
+        self._config_checked = time.monotonic()
+
+    def _current_config(self):
+        now = time.monotonic()
+        if now - self._config_checked > CONFIG_REFRESH:
+            self._config = get_config()
+            self._config_checked = now
+        return self._config
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, '_profiling_thread', None) is not None:
+            sampler.unregister(request._profiling_thread)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = self._current_config()
+        if not config['enabled'] or getattr(view_func, '__module__', '') != 'chatbot.views':
+            return None
+        if random.random() < config['rate']:
+            request._profiling_thread = threading.get_ident()
+            sampler.register(request._profiling_thread)
+        return None
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def profiling_admin(request):
+    """Admin page to switch profiling on/off and download collapsed stacks"""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        config = get_config()
+        if action == 'reset':
+            sampler.reset()
+        else:
+            try:
+                rate = min(max(float(request.POST.get('rate', config['rate'])), 0.0), 1.0)
+            except ValueError:
+                rate = config['rate']
+            cache.set(CONFIG_KEY, {'enabled': action == 'enable', 'rate': rate}, None)
+        return HttpResponseRedirect(request.path)
+
+    config = get_config()
+    html = f"""
+    <h1>Sampling profiler</h1>
+    <p>Status: <strong>{'enabled' if config['enabled'] else 'disabled'}</strong>,
+    sampling {config['rate'] * 100:g}% of requests to chatbot.views.</p>
+    <p>This worker: {sampler.samples} samples, {len(sampler.stacks)} / {sampler.max_stacks} distinct stacks.</p>
+    <form method="post">
+        <input type="hidden" name="csrfmiddlewaretoken" value="{get_token(request)}">
+        <label>Sample rate (0-1) <input name="rate" value="{config['rate']}"></label>
+        <button name="action" value="enable">Enable</button>
+        <button name="action" value="disable">Disable</button>
+        <button name="action" value="reset">Reset samples</button>
+    </form>
+    <p><a href="download/">Download collapsed stacks</a> (flamegraph.pl / speedscope)</p>
+    """
+    return HttpResponse(html)
+
+
+@staff_member_required
+def profiling_download(request):
+    """Collapsed stacks for this worker as a text attachment"""
+    response = HttpResponse(sampler.collapsed(), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="chatbot-profile.collapsed"'
+    return response
@@ -0,0 +1,116 @@
+"""
+Precomputed EMI grids for the amount and tenure sliders.
+
+A grid holds the EMI for every amount from QUOTE_GRID_AMOUNT_MIN up to the
+customer's pre-approved limit in QUOTE_GRID_AMOUNT_STEP steps, for every
+tenure in QUOTE_GRID_TENURES. Each value is exactly what
+SalesAgent.calculate_emi returns, so the EMI a user picks from the slider is
+the one /emi/ stores.
+
+calculate_emi works out principal * A / B, where A and B depend only on
+the rate and tenure. A and B are computed once per tenure, leaving one
+multiply and one divide per cell (the same operations in the same order,
+so the floats match). Grids are cached per rate and cover the most amounts
+asked for so far; a smaller limit gets a prefix.
+
+A row never has more than QUOTE_GRID_AMOUNTS_MAX amounts, so a very large
+limit gets the grid up to that cap rather than an oversized payload. The
+cache keeps the most recently used rates within QUOTE_GRID_CACHE_CELLS
+cells in total.
+
+Rows are per tenure and delta-encoded along the amount axis: the first EMI,
+then the difference from the previous amount. The differences are nearly
+constant, so the JSON is short and compresses well. The client rebuilds a
+row with a running sum.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+
+
+def tenures():
+    low, high = settings.QUOTE_GRID_TENURES
+    return range(low, high + 1)
+
+
+def amount_count(limit):
+    """Number of grid amounts up to `limit` (0 when the limit is below the minimum)"""
+    low, step = settings.QUOTE_GRID_AMOUNT_MIN, settings.QUOTE_GRID_AMOUNT_STEP
+    if limit is None or limit < low:
+        return 0
+    return min(int(limit - low) // step + 1, settings.QUOTE_GRID_AMOUNTS_MAX)
+
+
+def _emi_row(monthly_rate, tenure, amounts):
+    if monthly_rate == 0:
+        return [int(principal / tenure) for principal in amounts]
+    growth = (1 + monthly_rate) ** tenure
+    numerator, denominator = monthly_rate * growth, growth - 1
+    return [int(principal * numerator / denominator) for principal in amounts]
+
+
+def _delta_encode(row):
+    return row[:1] + [current - previous for previous, current in zip(row, row[1:])]
+
+
+def compute_grid(rate, count):
+    """Delta-encoded EMI rows, one per tenure, for the first `count` grid amounts"""
+    monthly_rate = float(rate) / 12 / 100
+    low, step = settings.QUOTE_GRID_AMOUNT_MIN, settings.QUOTE_GRID_AMOUNT_STEP
+    amounts = [float(low + step * i) for i in range(count)]
+    return [_delta_encode(_emi_row(monthly_rate, tenure, amounts)) for tenure in tenures()]
+
+
+def _cells(rows):
+    return len(rows) * len(rows[0])
+
+
+def emi_grid(rate, count):
+    """compute_grid(rate, count), served from the per-rate LRU cache"""
+    key = float(rate)
+    with _grids_lock:
+        rows = _grids.get(key)
+        if rows is not None:
+            _grids.move_to_end(key)
+    if rows is None or len(rows[0]) < count:
+        rows = compute_grid(rate, count)
+        budget = settings.QUOTE_GRID_CACHE_CELLS - _cells(rows)
+        # A grid larger than the whole cache is served uncached instead of evicting everything
+        if budget >= 0:
+            with _grids_lock:
+                _grids.pop(key, None)
+                cached = sum(_cells(grid) for grid in _grids.values())
+                while _grids and cached > budget:
+                    cached -= _cells(_grids.popitem(last=False)[1])
+                _grids[key] = rows
+    if len(rows[0]) == count:
+        return rows
+    return [row[:count] for row in rows]
+
+
+def quote_grid(rate, limit):
+    """Grid response for a customer's rate and pre-approved limit"""
+    low, high = settings.QUOTE_GRID_TENURES
+    count = amount_count(limit)
+    return {
+        'rate': float(rate),
+        'amount': {'min': settings.QUOTE_GRID_AMOUNT_MIN, 'step': settings.QUOTE_GRID_AMOUNT_STEP, 'count': count},
+        'tenure': {'min': low, 'max': high},
+        'encoding': 'delta',
+        'emi': emi_grid(rate, count) if count else [[] for _ in tenures()],
+    }
+
+
+def decode_row(row):
+    """Undo the delta encoding of one tenure row"""
+    values, total = [], 0
+    for delta in row:
+        total += delta
+        values.append(total)
+    return values
@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
+from .message_templates import render as render_template
 from .models import Customer, LoanApplication, ChatMessage
 
 
@@ -10,6 +13,8 @@ class CustomerSerializer(serializers.ModelSerializer):
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
+    content = serializers.CharField(source='text', read_only=True)
+
     class Meta:
         model = ChatMessage
         fields = ['id', 'message_type', 'content', 'metadata', 'created_at']
@@ -32,11 +37,110 @@ class LoanApplicationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'application_id', 'created_at', 'updated_at']
 
 
+def _datetime_formatter():
+    """DateTimeField.to_representation with the timezone looked up once"""
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return format_datetime
+
+
+_DECIMAL_FIELDS = {
+    name: serializers.DecimalField(
+        max_digits=LoanApplication._meta.get_field(name).max_digits,
+        decimal_places=LoanApplication._meta.get_field(name).decimal_places,
+    ).to_representation
+    for name in ['requested_amount', 'interest_rate', 'emi', 'monthly_income', 'foir']
+}
+
+
+def chat_messages_data(queryset):
+    """Same output as ChatMessageSerializer(queryset, many=True).data, from one values_list query
+
+    Skips model instances and per-field serializer calls; use on read paths.
+    """
+    format_datetime = _datetime_formatter()
+    rows = queryset.values_list('id', 'message_type', 'content', 'template', 'params', 'metadata', 'created_at')
+    return [
+        {
+            'id': message_id,
+            'message_type': message_type,
+            'content': content if template is None else render_template(template, params),
+            'metadata': metadata,
+            'created_at': format_datetime(created_at),
+        }
+        for message_id, message_type, content, template, params, metadata, created_at in rows
+    ]
+
+
+def loan_application_data(application):
+    """Same output as LoanApplicationSerializer(application).data, for read paths
+
+    Load the application with select_related('customer') so this costs two
+    queries: the application and its messages.
+    """
+    format_datetime = _datetime_formatter()
+    decimal = {
+        name: None if getattr(application, name) is None else to_representation(getattr(application, name))
+        for name, to_representation in _DECIMAL_FIELDS.items()
+    }
+    return {
+        'id': application.id,
+        'application_id': application.application_id,
+        'customer': application.customer_id,
+        'customer_name': application.customer.name,
+        'customer_email': application.customer.email,
+        'requested_amount': decimal['requested_amount'],
+        'tenure_months': application.tenure_months,
+        'interest_rate': decimal['interest_rate'],
+        'emi': decimal['emi'],
+        'credit_score': application.credit_score,
+        'monthly_income': decimal['monthly_income'],
+        'foir': decimal['foir'],
+        'status': application.status,
+        'kyc_verified': application.kyc_verified,
+        'messages': chat_messages_data(application.messages.all()),
+        'created_at': format_datetime(application.created_at),
+        'updated_at': format_datetime(application.updated_at),
+    }
+
+
 class ChatRequestSerializer(serializers.Serializer):
-    """Serializer for chat API requests"""
+    """Serializer for chat API requests
+
+    `data` holds the form fields for the current stage. `steps` can carry
+    several stages' form fields to run in order within one request.
+    """
+    application_id = serializers.CharField()
+    message = serializers.CharField(required=False, allow_blank=True)
+    stage = serializers.CharField(required=False, allow_blank=True)
+    data = serializers.DictField(required=False, default=dict)
+    steps = serializers.ListField(
+        child=serializers.DictField(), required=False, allow_empty=False, max_length=5
+    )
+
+
+class AffordabilityRequestSerializer(serializers.Serializer):
+    """Serializer for affordability questions
+
+    The EMI budget is the lower of `target_emi` and the FOIR cap on
+    `monthly_income` (the application's stored income when omitted).
+    """
     application_id = serializers.CharField()
-    message = serializers.CharField()
-    stage = serializers.CharField()
+    target_emi = serializers.IntegerField(required=False, min_value=1)
+    monthly_income = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, min_value=1)
+    tenures = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=360),
+        required=False, allow_empty=False, max_length=60
+    )
 
 
 class KYCRequestSerializer(serializers.Serializer):
@@ -46,6 +150,25 @@ class KYCRequestSerializer(serializers.Serializer):
     pan = serializers.CharField(max_length=10)
 
 
+class KYCItemSerializer(serializers.Serializer):
+    """Single Aadhaar/PAN pair in a bulk KYC request"""
+    reference = serializers.CharField(required=False, allow_blank=True)
+    aadhar = serializers.CharField(max_length=14)
+    pan = serializers.CharField(max_length=10)
+
+
+class KYCBulkRequestSerializer(serializers.Serializer):
+    """Serializer for bulk KYC verification"""
+    items = KYCItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > settings.KYC_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {settings.KYC_BULK_MAX_ITEMS} items can be verified per request.'
+            )
+        return value
+
+
 class EligibilityRequestSerializer(serializers.Serializer):
     """Serializer for eligibility check"""
     application_id = serializers.CharField()
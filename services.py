@@ -2,12 +2,15 @@ import random
 import math
 from decimal import Decimal
 from .models import LoanApplication, ChatMessage, Customer
+from .kyc import get_kyc_service
+from .metrics import timed
 
 
 class MasterAgent:
     """Stage 1: Pre-Approved Offer"""
     
     @staticmethod
+    @timed('MasterAgent', 'greet')
     def greet(phone):
         """Get pre-approved offer for customer"""
         try:
@@ -36,6 +39,7 @@ class SalesAgent:
     """Stage 2: EMI Preview & Explanation"""
     
     @staticmethod
+    @timed('SalesAgent', 'calculate_emi')
     def calculate_emi(principal, annual_rate, tenure_months):
         """Calculate EMI using standard formula"""
         principal = float(principal)
@@ -49,6 +53,7 @@ class SalesAgent:
         return int(emi)
     
     @staticmethod
+    @timed('SalesAgent', 'generate_emi_options')
     def generate_emi_options(amount, rate, tenures=[12, 24, 36]):
         """Generate EMI options for different tenures"""
         options = []
@@ -63,6 +68,7 @@ class SalesAgent:
         return options
     
     @staticmethod
+    @timed('SalesAgent', 'preview_emi')
     def preview_emi(application, amount):
         """Generate EMI preview message"""
         customer = application.customer
@@ -86,21 +92,84 @@ class SalesAgent:
             'message': message,
             'stage': 'kyc'
         }
+    
+    @staticmethod
+    @timed('SalesAgent', 'max_principals')
+    def max_principals(emi_budget, annual_rate, tenures, limit=None):
+        """Largest whole-rupee principal per tenure whose calculate_emi is within emi_budget
+        
+        EMI is principal * A / B with A and B fixed by rate and tenure, so the
+        bound comes straight from B / A; the nudges after it only absorb float
+        rounding around calculate_emi's truncation.
+        """
+        monthly_rate = float(annual_rate) / 12 / 100
+        budget = int(emi_budget)
+        principals = []
+        for tenure in tenures:
+            if monthly_rate == 0:
+                numerator, denominator = 1.0, float(tenure)
+            else:
+                growth = (1 + monthly_rate) ** tenure
+                numerator, denominator = monthly_rate * growth, growth - 1
+            
+            def emi(principal):
+                return int(float(principal) * numerator / denominator)
+            
+            principal = max(int((budget + 1) * denominator / numerator), 0)
+            while principal > 0 and emi(principal) > budget:
+                principal -= 1
+            while emi(principal + 1) <= budget:
+                principal += 1
+            if limit is not None:
+                principal = min(principal, int(limit))
+            principals.append(principal)
+        return principals
+    
+    @staticmethod
+    @timed('SalesAgent', 'affordability')
+    def affordability(customer, emi_budget, tenures=[12, 24, 36]):
+        """Maximum loan per tenure for a monthly EMI budget"""
+        principals = SalesAgent.max_principals(
+            emi_budget, customer.pre_approved_rate, tenures, customer.pre_approved_limit
+        )
+        options = []
+        for tenure, principal in zip(tenures, principals):
+            emi = SalesAgent.calculate_emi(principal, customer.pre_approved_rate, tenure) if principal else 0
+            options.append({
+                'tenure': tenure,
+                'max_amount': principal,
+                'emi': emi,
+                'total_amount': emi * tenure,
+                'capped_by_limit': principal >= int(customer.pre_approved_limit)
+            })
+        
+        message = f'With an EMI of up to ₹{int(emi_budget):,}/month you can borrow:\n\n'
+        for opt in options:
+            cap = ' (your pre-approved limit)' if opt['capped_by_limit'] else ''
+            message += f"• {opt['tenure']} months: up to ₹{opt['max_amount']:,}{cap}, EMI ₹{opt['emi']:,}/month\n"
+        
+        return {
+            'success': True,
+            'emi_budget': int(emi_budget),
+            'options': options,
+            'message': message
+        }
 
 
 class VerificationAgent:
     """Stage 3: Instant KYC Validation"""
     
     @staticmethod
+    @timed('VerificationAgent', 'verify_kyc')
     def verify_kyc(application, aadhar, pan):
         """Validate KYC documents"""
-        # Dummy validation: PAN must end with 'P'
-        is_valid = pan.upper().endswith('P') and len(aadhar) == 12 and aadhar.isdigit()
+        service = get_kyc_service()
+        result = service.verify(aadhar, pan)
         
-        application.kyc_aadhar = aadhar
-        application.kyc_pan = pan.upper()
+        # Store what was validated: '2345 6789 0124' would not fit kyc_aadhar
+        application.kyc_aadhar, application.kyc_pan = service.normalize(aadhar, pan)
         
-        if is_valid:
+        if result['valid']:
             application.kyc_verified = True
             application.status = 'kyc_done'
             application.save()
@@ -112,9 +181,11 @@ class VerificationAgent:
             }
         else:
             application.save()
+            reasons = '\n'.join(f'• {error}' for error in result['errors'])
             return {
                 'success': False,
-                'message': '❌ KYC Verification Failed!\n\nPlease ensure your Aadhaar is 12 digits and PAN ends with "P".',
+                'message': f'❌ KYC Verification Failed!\n\n{reasons}',
+                'errors': result['errors'],
                 'stage': 'kyc'
             }
 
@@ -122,12 +193,17 @@ class VerificationAgent:
 class UnderwritingAgent:
     """Stage 4: Smart Eligibility Decision"""
     
+    # EMI as a percentage of monthly income above which approval is only conditional
+    FOIR_LIMIT = 50
+    
     @staticmethod
+    @timed('UnderwritingAgent', 'simulate_credit_score')
     def simulate_credit_score():
         """Generate random credit score (650-800)"""
         return random.randint(650, 800)
     
     @staticmethod
+    @timed('UnderwritingAgent', 'check_eligibility')
     def check_eligibility(application, monthly_income):
         """Check loan eligibility based on credit score and FOIR"""
         
@@ -144,7 +220,7 @@ class UnderwritingAgent:
         if credit_score < 700:
             decision = 'rejected'
             message = '❌ Unfortunately, we cannot approve your loan at this time due to a lower credit score.'
-        elif application.foir and application.foir > 50:
+        elif application.foir and application.foir > UnderwritingAgent.FOIR_LIMIT:
             decision = 'conditional'
             message = '⚠️ Your loan is conditionally approved. You may need to provide additional documentation.'
         else:
@@ -169,6 +245,7 @@ class SanctionAgent:
     """Stage 5: Auto Sanction Letter"""
     
     @staticmethod
+    @timed('SanctionAgent', 'generate_sanction_letter_html')
     def generate_sanction_letter_html(application):
         """Generate HTML sanction letter"""
         
@@ -5,6 +5,7 @@ Django settings for loan_chatbot project.
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -30,6 +31,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chatbot.metrics.MetricsMiddleware',
+    'chatbot.tracing.TracingMiddleware',
+    'chatbot.profiling.ProfilingMiddleware',
+    'chatbot.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -65,6 +70,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # File-backed test DB: in-memory SQLite fails concurrent writers instead of waiting
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -84,6 +91,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache, shared by all workers when CACHE_URL points at Redis (redis://host:6379/0)
+CACHE_URL = os.getenv('CACHE_URL', '')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Kolkata'
@@ -105,10 +123,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'chatbot.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'chatbot.renderers.ORJSONParser',
     ],
 }
 
@@ -120,3 +138,91 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGINS = DEBUG
+
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+# KYC
+KYC_VALIDATORS = [
+    'chatbot.kyc.validate_aadhar',
+    'chatbot.kyc.validate_pan',
+]
+
+# Remote verification, e.g. KYC_PROVIDER=chatbot.kyc.HTTPKYCProvider
+KYC_PROVIDER = os.getenv('KYC_PROVIDER', '')
+KYC_PROVIDER_OPTIONS = {
+    'url': os.getenv('KYC_PROVIDER_URL', ''),
+    'api_key': os.getenv('KYC_PROVIDER_API_KEY', ''),
+    'timeout': float(os.getenv('KYC_PROVIDER_TIMEOUT', '5')),
+    'pool_size': int(os.getenv('KYC_PROVIDER_POOL_SIZE', '10')),
+}
+
+KYC_BULK_MAX_ITEMS = 100
+
+# Verification results are cached under an HMAC of the documents; 0 disables
+KYC_RESULT_TTL = int(os.getenv('KYC_RESULT_TTL', '86400'))
+KYC_RESULT_SALT = os.getenv('KYC_RESULT_SALT', SECRET_KEY)
+
+# Idempotency-Key replay window for stage POST endpoints
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+# Cached per-application conversation state
+CONVERSATION_STATE_TTL = int(os.getenv('CONVERSATION_STATE_TTL', '3600'))
+
+# Metrics (Prometheus text format at /metrics); off by default
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_LATENCY_BUCKETS = [
+    float(b) for b in os.getenv('METRICS_LATENCY_BUCKETS', '').split(',') if b
+]
+
+# Tracing (OTLP/JSON spans to a local file or a collector); off by default
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False') == 'True'
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'loanwise-chatbot')
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file')  # 'file' or 'otlp'
+TRACING_FILE = os.getenv('TRACING_FILE', str(BASE_DIR / 'traces.jsonl'))
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+
+# Sampling profiler, switched on at runtime from /admin/profiling/
+PROFILING_AVAILABLE = os.getenv('PROFILING_AVAILABLE', 'True') == 'True'
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_INTERVAL = 0.005
+PROFILING_MAX_STACKS = 5000
+PROFILING_MAX_DEPTH = 64
+
+# Rate limits per endpoint, per client IP and per phone number
+THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND', 'local')  # 'local' or 'cache'
+THROTTLE_TRUST_FORWARDED_FOR = os.getenv('THROTTLE_TRUST_FORWARDED_FOR', 'False') == 'True'
+THROTTLE_RATES = {
+    'start': {'ip': '30/min', 'phone': '5/min'},
+    'check_user': {'ip': '60/min', 'phone': '10/min'},
+    'kyc_bulk': {'ip': '10/min'},
+} if os.getenv('THROTTLE_ENABLED', 'True') == 'True' else {}
+
+# Bloom filter of customer phones in front of the customers lookup
+PHONE_FILTER_ENABLED = os.getenv('PHONE_FILTER_ENABLED', 'True') == 'True'
+PHONE_FILTER_CAPACITY = 1000000
+PHONE_FILTER_ERROR_RATE = 0.01
+PHONE_FILTER_REFRESH = 30
+PHONE_FILTER_LAG = 60  # re-read window for rows committed after their updated_at
+PHONE_FILTER_SNAPSHOT = os.getenv('PHONE_FILTER_SNAPSHOT', str(BASE_DIR / 'phone_filter.bin'))
+PHONE_FILTER_SNAPSHOT_INTERVAL = 300
+
+# Host part (0-255) of the node id in application IDs; workers add their pid
+APP_ID_NODE = os.getenv('APP_ID_NODE')
+
+# Chat transcripts of finished applications moved to compressed segments
+CHAT_ARCHIVE_DIR = os.getenv('CHAT_ARCHIVE_DIR', str(BASE_DIR / 'chat_archive'))
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', '90'))
+CHAT_ARCHIVE_SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Response compression (brotli when installed, else gzip) for bodies of at least this many bytes
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Precomputed EMI grid for the amount/tenure sliders
+QUOTE_GRID_AMOUNT_MIN = 10000
+QUOTE_GRID_AMOUNT_STEP = int(os.getenv('QUOTE_GRID_AMOUNT_STEP', '5000'))
+QUOTE_GRID_TENURES = (6, 60)  # months, one column per month
+QUOTE_GRID_AMOUNTS_MAX = 1000  # amounts per row; larger limits are capped
+QUOTE_GRID_CACHE_CELLS = 500000  # EMIs kept across all cached rates
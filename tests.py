@@ -1,3 +1,893 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import importlib
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from threading import Barrier
+from unittest import mock
+
+import pyarrow.parquet as pq
+
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import (
+    analytics_export, archive, funnel, idempotency, ids, metrics, phone_filter, quotes, tracing, views
+)
+from .compression import choose_encoding
+from .conversation import guard, load_state
+from .models import Customer, FunnelDaily, FunnelProgress, LoanApplication, ChatMessage
+from .profiling import TRUNCATED, StackSampler
+from .quotes import decode_row
+from .serializers import LoanApplicationSerializer, loan_application_data
+from .services import SalesAgent, VerificationAgent
+from .throttling import LocalWindowStore
+from .views import _sse_event
 
 # Create your tests here.
+
+# The phone filter must not snapshot a bloom built from the test database to PHONE_FILTER_SNAPSHOT
+_no_phone_filter_snapshot = override_settings(PHONE_FILTER_SNAPSHOT=None)
+
+
+def setUpModule():
+    _no_phone_filter_snapshot.enable()
+
+
+def tearDownModule():
+    _no_phone_filter_snapshot.disable()
+
+
+@override_settings(THROTTLE_RATES={})
+class StartApplicationConcurrencyTests(TransactionTestCase):
+    """First visits from one phone racing each other"""
+
+    STARTS = 100
+
+    def test_simultaneous_starts_for_one_phone(self):
+        barrier = Barrier(self.STARTS)
+
+        def start():
+            try:
+                barrier.wait()
+                return APIClient().post('/chatbot/api/start/', {'phone': '9000000001'}, format='json')
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.STARTS) as pool:
+            responses = list(pool.map(lambda _: start(), range(self.STARTS)))
+
+        self.assertEqual([r.status_code for r in responses], [201] * self.STARTS)
+        self.assertEqual(sum(r.data['is_new_user'] for r in responses), 1)
+        self.assertEqual(Customer.objects.filter(phone='9000000001').count(), 1)
+        self.assertEqual(LoanApplication.objects.count(), self.STARTS)
+        self.assertEqual(len({r.data['application_id'] for r in responses}), self.STARTS)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist pages cost the same number of queries however many rows they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@loanwise.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_applications(self, count):
+        start = Customer.objects.count()
+        for i in range(start, start + count):
+            customer = Customer.objects.create(
+                phone=f'{8000000000 + i}', name=f'User {i}', email=f'user{i}@loanwise.com',
+                pre_approved_limit=300000, pre_approved_rate=13.0
+            )
+            application = LoanApplication.objects.create(customer=customer, application_id=f'APPTEST{i:06d}')
+            ChatMessage.objects.create(application=application, message_type='user', content=f'Message {i}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant(self, url):
+        self.add_applications(3)
+        few = self.count_queries(url)
+        self.add_applications(60)
+        self.assertEqual(self.count_queries(url), few)
+
+    def test_loan_application_changelist(self):
+        self.assert_constant(reverse('admin:chatbot_loanapplication_changelist'))
+
+    def test_chat_message_changelist(self):
+        self.assert_constant(reverse('admin:chatbot_chatmessage_changelist'))
+
+    def test_search_and_filters(self):
+        url = reverse('admin:chatbot_loanapplication_changelist')
+        self.assert_constant(f'{url}?q=80000&status__exact=initiated')
+
+    def test_keyset_pages(self):
+        self.add_applications(130)
+        url = reverse('admin:chatbot_loanapplication_changelist')
+        first = self.client.get(url)
+        cursor = first.context['cl'].next_cursor
+        self.assertIsNotNone(cursor)
+        second = self.client.get(f'{url}?cursor={cursor}')
+        first_ids = {obj.pk for obj in first.context['cl'].result_list}
+        second_ids = {obj.pk for obj in second.context['cl'].result_list}
+        self.assertEqual(len(first_ids), 100)
+        self.assertEqual(len(second_ids), 30)
+        self.assertFalse(first_ids & second_ids)
+        self.assertIsNone(second.context['cl'].next_cursor)
+        self.assertEqual(self.count_queries(f'{url}?cursor={cursor}'), self.count_queries(url))
+
+
+class LoanApplicationDataTests(TestCase):
+    """The read-path builder renders exactly what LoanApplicationSerializer does"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            phone='9000000002', name='Read Path', email='read@loanwise.com',
+            pre_approved_limit=500000, pre_approved_rate=12.5
+        )
+
+    def assert_same_bytes(self, application_id):
+        application = LoanApplication.objects.get(application_id=application_id)
+        expected = JSONRenderer().render(LoanApplicationSerializer(application).data)
+        application = LoanApplication.objects.select_related('customer').get(application_id=application_id)
+        self.assertEqual(JSONRenderer().render(loan_application_data(application)), expected)
+
+    def test_new_application(self):
+        LoanApplication.objects.create(customer=self.customer, application_id='APPREAD000001')
+        self.assert_same_bytes('APPREAD000001')
+
+    def test_filled_in_application_with_transcript(self):
+        application = LoanApplication.objects.create(
+            customer=self.customer, application_id='APPREAD000002', requested_amount=250000,
+            tenure_months=24, interest_rate='12.50', emi='11827.37', credit_score=760,
+            monthly_income=85000, foir='13.9', status='approved', kyc_verified=True
+        )
+        ChatMessage.objects.create(application=application, message_type='user',
+                                   content='I want to borrow ₹2,50,000 for 24 months')
+        ChatMessage.objects.create(application=application, message_type='sales_agent',
+                                   content="Perfect! Your monthly EMI will be ₹11,827. Now let's verify your KYC.",
+                                   metadata={'emi': 11827.37, 'tenure': 24})
+        ChatMessage.objects.create(application=application, message_type='system', content='Free text\u2028here')
+        self.assertTrue(application.messages.filter(template__isnull=False).exists())
+        self.assert_same_bytes('APPREAD000002')
+
+
+class ApplicationCachingTests(TestCase):
+    """get_application revalidates with ETags and negotiates compression"""
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            phone='9000000003', name='Cache User', email='cache@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.application = LoanApplication.objects.create(customer=customer, application_id='APPCACHE00001')
+        for i in range(40):
+            ChatMessage.objects.create(application=self.application, message_type='user', content=f'Message number {i}')
+        self.url = reverse('get_application', args=['APPCACHE00001'])
+
+    def test_not_modified_until_a_message_is_added(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ChatMessage.objects.create(application=self.application, message_type='user', content='One more')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_gzip_response_and_weak_etag(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0.5')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(compressed['ETag'], 'W/' + plain['ETag'])
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=compressed['ETag']).status_code, 304)
+
+    def test_choose_encoding(self):
+        self.assertIsNone(choose_encoding(''))
+        self.assertIsNone(choose_encoding('identity, gzip;q=0'))
+        self.assertEqual(choose_encoding('deflate, gzip;q=0.8'), 'gzip')
+        self.assertEqual(choose_encoding('br, gzip', html=True), 'gzip')
+
+
+class QuoteGridTests(TestCase):
+    """The slider grid holds exactly the EMIs /emi/ would compute"""
+
+    def grid_for(self, rate, limit):
+        customer = Customer.objects.create(
+            phone=f'91{Customer.objects.count():08d}', name='Grid User', email='grid@loanwise.com',
+            pre_approved_limit=limit, pre_approved_rate=rate
+        )
+        application = LoanApplication.objects.create(
+            customer=customer, application_id=f'APPGRID{Customer.objects.count():06d}'
+        )
+        response = self.client.get(reverse('quote_grid', args=[application.application_id]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assert_matches_calculate_emi(self, rate, limit):
+        grid = self.grid_for(rate, limit)
+        amounts = [grid['amount']['min'] + grid['amount']['step'] * i for i in range(grid['amount']['count'])]
+        self.assertLessEqual(amounts[-1], limit)
+        self.assertGreater(amounts[-1] + grid['amount']['step'], limit)
+        for tenure, row in zip(range(grid['tenure']['min'], grid['tenure']['max'] + 1), grid['emi']):
+            expected = [SalesAgent.calculate_emi(amount, Decimal(rate), tenure) for amount in amounts]
+            self.assertEqual(decode_row(row), expected)
+
+    def test_grid_matches_calculate_emi(self):
+        self.assert_matches_calculate_emi('12.50', 500000)
+        self.assert_matches_calculate_emi('13.00', 302500)
+        self.assert_matches_calculate_emi('0.00', 50000)
+
+    def test_limit_below_minimum(self):
+        grid = self.grid_for('13.00', 5000)
+        self.assertEqual(grid['amount']['count'], 0)
+        self.assertTrue(all(row == [] for row in grid['emi']))
+
+    def test_unknown_application(self):
+        response = self.client.get(reverse('quote_grid', args=['APPMISSING']))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(QUOTE_GRID_AMOUNTS_MAX=50)
+    def test_amounts_are_capped(self):
+        grid = self.grid_for('12.50', 100000000)
+        self.assertEqual(grid['amount']['count'], 50)
+        self.assertTrue(all(len(row) == 50 for row in grid['emi']))
+
+    @override_settings(QUOTE_GRID_CACHE_CELLS=55 * 20 * 2)
+    def test_cache_keeps_recent_rates_within_budget(self):
+        quotes._grids.clear()
+        for rate in ('11.00', '12.00', '11.00', '13.00'):
+            quotes.emi_grid(Decimal(rate), 20)
+        self.assertEqual(list(quotes._grids), [11.0, 13.0])
+
+    @override_settings(QUOTE_GRID_CACHE_CELLS=55 * 20 * 2)
+    def test_oversized_grid_is_not_cached(self):
+        quotes._grids.clear()
+        quotes.emi_grid(Decimal('11.00'), 20)
+        self.assertEqual(len(quotes.emi_grid(Decimal('12.00'), 60)[0]), 60)
+        self.assertEqual(list(quotes._grids), [11.0])
+
+
+class AffordabilityTests(TestCase):
+    """The inverse solver returns the largest principal calculate_emi keeps within budget"""
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            phone='9000000004', name='Budget User', email='budget@loanwise.com',
+            pre_approved_limit=500000, pre_approved_rate=12.5
+        )
+        LoanApplication.objects.create(customer=customer, application_id='APPBUDGET0001', monthly_income=60000)
+
+    def test_max_principals_are_exact(self):
+        tenures = list(range(6, 61))
+        for rate in ['0', '7.25', '12.50', '13', '24.99']:
+            for budget in [1, 999, 5000, 11827, 43210]:
+                principals = SalesAgent.max_principals(budget, Decimal(rate), tenures)
+                for tenure, principal in zip(tenures, principals):
+                    self.assertLessEqual(SalesAgent.calculate_emi(principal, Decimal(rate), tenure), budget)
+                    self.assertGreater(SalesAgent.calculate_emi(principal + 1, Decimal(rate), tenure), budget)
+
+    def test_target_emi_below_foir_cap(self):
+        response = self.client.post(reverse('affordability'), {
+            'application_id': 'APPBUDGET0001', 'target_emi': 10000, 'tenures': [12, 24]
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['limited_by'], 'target_emi')
+        self.assertEqual([opt['tenure'] for opt in response.data['options']], [12, 24])
+        for opt in response.data['options']:
+            self.assertLessEqual(opt['emi'], 10000)
+            self.assertFalse(opt['capped_by_limit'])
+
+    def test_foir_cap_and_pre_approved_limit(self):
+        response = self.client.post(reverse('affordability'), {
+            'application_id': 'APPBUDGET0001', 'target_emi': 90000
+        }, content_type='application/json')
+        self.assertEqual(response.data['limited_by'], 'foir')
+        self.assertEqual(response.data['emi_budget'], 30000)
+        longest = response.data['options'][-1]
+        self.assertEqual(longest['max_amount'], 500000)
+        self.assertTrue(longest['capped_by_limit'])
+
+    def test_budget_required(self):
+        LoanApplication.objects.filter(application_id='APPBUDGET0001').update(monthly_income=None)
+        response = self.client.post(reverse('affordability'), {
+            'application_id': 'APPBUDGET0001'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(THROTTLE_RATES={})
+class KYCTests(TestCase):
+    """Bulk verification is staff-only and stored documents are normalized"""
+
+    def test_bulk_requires_staff(self):
+        url = reverse('verify_kyc_bulk')
+        payload = {'items': [{'aadhar': '234567890124', 'pan': 'ABCPE1234F'}]}
+        self.assertEqual(self.client.post(url, payload, content_type='application/json').status_code, 403)
+        self.client.force_login(User.objects.create_superuser('kyc', 'kyc@loanwise.com', 'password'))
+        response = self.client.post(url, payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 1)
+
+    def test_bulk_is_throttled(self):
+        self.client.force_login(User.objects.create_superuser('kyc', 'kyc@loanwise.com', 'password'))
+        url = reverse('verify_kyc_bulk')
+        payload = {'items': [{'aadhar': '234567890124', 'pan': 'ABCPE1234F'}]}
+        with override_settings(THROTTLE_RATES={'kyc_bulk': {'ip': '2/min'}}):
+            statuses = [self.client.post(url, payload, content_type='application/json').status_code
+                        for _ in range(3)]
+        self.assertEqual(statuses[-1], 429)
+
+    def test_spaced_aadhaar_is_stored_normalized(self):
+        customer = Customer.objects.create(
+            phone='9000000005', name='KYC User', email='kyc@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        application = LoanApplication.objects.create(customer=customer, application_id='APPKYC000001')
+        result = VerificationAgent.verify_kyc(application, '2345 6789 0124', 'abcpe1234f')
+        self.assertTrue(result['success'])
+        application.refresh_from_db()
+        self.assertEqual((application.kyc_aadhar, application.kyc_pan), ('234567890124', 'ABCPE1234F'))
+
+
+class IdempotencyTests(TestCase):
+    """Repeated Idempotency-Keys replay the first response instead of re-running the view"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        @api_view(['POST'])
+        @idempotency.idempotent
+        def view(request):
+            self.calls += 1
+            return Response({'call': self.calls})
+
+        self.view = view
+
+    def post(self, body, key='key-1'):
+        request = APIRequestFactory().post('/stage/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return self.view(request)
+
+    def test_replay_and_body_mismatch(self):
+        self.assertEqual(self.post({'aadhar': '234567890124'}).data, {'call': 1})
+        replayed = self.post({'aadhar': '234567890124'})
+        self.assertEqual(replayed.data, {'call': 1})
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.post({'aadhar': '345678901234'}).status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_racing_the_first_response(self):
+        self.post({'amount': 1})
+
+        class MissFirstRead:
+            """The retry's first read happened just before the first request stored its response"""
+            missed = False
+
+            def get(self, key):
+                if not self.missed:
+                    self.missed = True
+                    return None
+                return cache.get(key)
+
+            def __getattr__(self, name):
+                return getattr(cache, name)
+
+        with mock.patch.object(idempotency, 'cache', MissFirstRead()):
+            self.assertEqual(self.post({'amount': 1}).data, {'call': 1})
+        self.assertEqual(self.calls, 1)
+
+    def test_body_hash_is_keyed(self):
+        body_hash = idempotency._body_hash(mock.Mock(data={'aadhar': '234567890124'}))
+        self.assertNotEqual(body_hash, hashlib.sha256(b'{"aadhar": "234567890124"}').hexdigest())
+
+
+class ConversationGuardTests(TestCase):
+    """A stale cached stage never decides a 409 or lets an invalid action through"""
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            phone='9000000006', name='Guard User', email='guard@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.application = LoanApplication.objects.create(
+            customer=customer, application_id='APPGUARD00001', status='pre_offer'
+        )
+
+    def advance_elsewhere(self, status):
+        """Change the row the way another worker would, leaving this process's cache behind"""
+        LoanApplication.objects.filter(pk=self.application.pk).update(status=status)
+        self.assertEqual(load_state('APPGUARD00001').status, 'pre_offer')
+
+    def test_stale_rejection_is_rechecked(self):
+        self.advance_elsewhere('emi_preview')
+        state, error = guard('APPGUARD00001', 'kyc')
+        self.assertIsNone(error)
+        self.assertEqual(state.status, 'emi_preview')
+        self.assertEqual(load_state('APPGUARD00001').status, 'emi_preview')
+
+    def test_stale_allow_is_caught_on_the_row(self):
+        self.advance_elsewhere('sanctioned')
+        response = self.client.post('/chatbot/api/emi/', {
+            'application_id': 'APPGUARD00001', 'amount': 100000, 'tenure': 12
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'sanctioned')
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.status, 'sanctioned')
+
+    def test_unknown_application(self):
+        state, error = guard('APPMISSING', 'emi')
+        self.assertIsNone(state)
+        self.assertEqual(error.status_code, 404)
+
+
+class ChatDispatchTests(TestCase):
+    """The chat endpoints route steps by the server-side stage"""
+
+    def setUp(self):
+        customer = Customer.objects.create(
+            phone='9000000007', name='Chat User', email='chat@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        LoanApplication.objects.create(customer=customer, application_id='APPCHAT00001', status='pre_offer')
+        self.steps = [{'amount': 100000, 'tenure': 12}, {'aadhar': '234567890124', 'pan': 'ABCPE1234F'}]
+
+    def test_steps_run_in_order(self):
+        response = self.client.post('/chatbot/api/chat/', {
+            'application_id': 'APPCHAT00001', 'stage': 'emi', 'steps': self.steps
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['success'])
+        self.assertEqual([turn['step'] for turn in response.data['turns']], ['emi', 'kyc'])
+        self.assertEqual(response.data['stage'], load_state('APPCHAT00001').stage)
+        self.assertEqual(response.data['stage'], 'eligibility')
+
+    def test_stage_mismatch_returns_real_stage(self):
+        response = self.client.post('/chatbot/api/chat/', {
+            'application_id': 'APPCHAT00001', 'stage': 'kyc', 'data': self.steps[1]
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['stage'], 'emi')
+        self.assertFalse(ChatMessage.objects.exists())
+
+    def test_sse_event_framing(self):
+        self.assertEqual(
+            _sse_event('step', {'emi': Decimal('8932.50')}), 'event: step\ndata: {"emi": "8932.50"}\n\n'
+        )
+
+    async def test_stream_sends_one_event_per_step(self):
+        response = await self.async_client.post('/chatbot/api/chat/stream/', {
+            'application_id': 'APPCHAT00001', 'steps': self.steps
+        }, content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.startswith(': stream open\n\n'))
+        events = [block.split('\n')[0] for block in body.split('\n\n')[1:] if block]
+        self.assertEqual(events, ['event: step', 'event: step', 'event: done'])
+        self.assertIn('"stage": "eligibility"', body.rsplit('event: done', 1)[1])
+
+
+class TracingTests(TestCase):
+    """Spans nest under the active span and continue an incoming traceparent"""
+
+    def setUp(self):
+        patcher = mock.patch.object(tracing, 'get_processor')
+        self.processor = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def exported(self):
+        return [call.args[0] for call in self.processor.on_end.call_args_list]
+
+    def test_child_span_joins_parent_trace(self):
+        with tracing.Span('outer') as outer:
+            with tracing.Span('inner') as inner:
+                self.assertIs(tracing.current_span(), inner)
+        self.assertIsNone(tracing.current_span())
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(inner.parent_span_id, outer.span_id)
+        self.assertEqual([data['name'] for data in self.exported()], ['inner', 'outer'])
+        self.assertNotIn('parentSpanId', self.exported()[1])
+
+    def test_parse_traceparent(self):
+        header = f"00-{'a' * 32}-{'b' * 16}-01"
+        self.assertEqual(tracing._parse_traceparent(header), ('a' * 32, 'b' * 16))
+        self.assertEqual(tracing._parse_traceparent('00-abc-def-01'), (None, None))
+        self.assertEqual(tracing._parse_traceparent(''), (None, None))
+
+    def test_middleware_continues_incoming_trace(self):
+        with mock.patch.object(tracing, 'ENABLED', True):
+            middleware = tracing.TracingMiddleware(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/chatbot/', HTTP_TRACEPARENT=f"00-{'a' * 32}-{'b' * 16}-01")
+        response = middleware(request)
+        root = self.exported()[-1]
+        self.assertEqual((root['traceId'], root['parentSpanId']), ('a' * 32, 'b' * 16))
+        self.assertEqual(response['traceparent'], f"00-{'a' * 32}-{root['spanId']}-01")
+
+
+class StackSamplerTests(TestCase):
+    """The sampler's stack table and depth stay bounded"""
+
+    def test_new_stacks_past_the_limit_are_truncated(self):
+        sampler = StackSampler(interval=0.01, max_stacks=2, max_depth=64)
+        sampler._record(['views.py:a', 'views.py:b', 'views.py:c', 'views.py:a', 'views.py:d'])
+        self.assertEqual(sampler.stacks, {'views.py:a': 2, 'views.py:b': 1, TRUNCATED: 2})
+        self.assertEqual(sampler.samples, 5)
+        self.assertEqual(sampler.collapsed().splitlines()[0], 'views.py:a 2')
+
+    def test_collapse_keeps_innermost_frames(self):
+        sampler = StackSampler(interval=0.01, max_stacks=10, max_depth=2)
+        names = sampler._collapse(sys._getframe()).split(';')
+        self.assertEqual(len(names), 2)
+        self.assertEqual(names[-1], 'tests.py:test_collapse_keeps_innermost_frames')
+
+
+class ServerTimingTests(TestCase):
+    """Per-request timings are only disclosed to DEBUG or metrics-token requests"""
+
+    def setUp(self):
+        with mock.patch.object(metrics, 'ENABLED', True):
+            self.middleware = metrics.MetricsMiddleware(lambda request: HttpResponse('ok'))
+
+    def get(self, **headers):
+        return self.middleware(RequestFactory().get('/chatbot/', **headers))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_header_needs_the_token(self):
+        self.assertNotIn('Server-Timing', self.get())
+        self.assertNotIn('Server-Timing', self.get(HTTP_AUTHORIZATION='Bearer wrong'))
+        self.assertIn('db;desc="0 queries"', self.get(HTTP_AUTHORIZATION='Bearer secret')['Server-Timing'])
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_header_in_debug(self):
+        self.assertIn('Server-Timing', self.get())
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_header_without_a_token(self):
+        self.assertNotIn('Server-Timing', self.get(HTTP_AUTHORIZATION='Bearer '))
+
+
+class LocalWindowStoreTests(TestCase):
+    """In-process throttle counters stay within max_keys"""
+
+    def test_limit_within_window(self):
+        store = LocalWindowStore()
+        results = [store.hit('start:ip:1', 2, 60, 120.0 + i)[0] for i in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(store.hit('start:ip:1', 2, 60, 250.0)[0])
+
+    def test_least_recently_hit_key_is_evicted(self):
+        store = LocalWindowStore(max_keys=2)
+        for key in ['a', 'b', 'a', 'c']:
+            store.hit(key, 10, 60, 120.0)
+        self.assertEqual(list(store._windows), ['a', 'c'])
+        self.assertEqual(store._windows['a'][1], 2)
+
+
+class PhoneFilterTests(TestCase):
+    """The phone filter catches up on late commits and changed numbers"""
+
+    def setUp(self):
+        cache.clear()
+        Customer.objects.create(
+            phone='9000000010', name='Filter User', email='filter@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.filter = phone_filter.PhoneFilter()
+        self.filter._build()
+
+    def test_readding_is_not_counted(self):
+        bloom = phone_filter.BloomFilter(100, 0.01)
+        bloom.add('9000000011')
+        bloom.add('9000000011')
+        self.assertEqual(bloom.count, 1)
+
+    def test_late_commit_is_picked_up(self):
+        # Saved before the newest row the filter has seen, committed after its last scan
+        Customer.objects.bulk_create([Customer(
+            phone='9000000012', name='Late User', email='late@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )])
+        Customer.objects.filter(phone='9000000012').update(updated_at=self.filter.high_water - timedelta(seconds=5))
+        self.assertNotIn('9000000012', self.filter.bloom)
+        self.filter._catch_up()
+        self.assertIn('9000000012', self.filter.bloom)
+
+    def test_changed_number_is_added(self):
+        customer = Customer.objects.get(phone='9000000010')
+        with mock.patch.object(phone_filter.phone_filter, 'add') as add:
+            customer.save(update_fields=['name'])
+            add.assert_not_called()
+            customer.phone = '9000000013'
+            customer.save()
+        add.assert_called_once_with('9000000013')
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'phone_filter.bin')
+            with override_settings(PHONE_FILTER_SNAPSHOT=path):
+                self.filter._save_snapshot()
+                restored = phone_filter.PhoneFilter()
+                self.assertTrue(restored._load_snapshot())
+            self.assertEqual(os.listdir(tmpdir), ['phone_filter.bin'])
+        self.assertEqual(restored.high_water, self.filter.high_water)
+        self.assertIn('9000000010', restored.bloom)
+
+    def test_snapshot_from_another_database_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with override_settings(PHONE_FILTER_SNAPSHOT=os.path.join(tmpdir, 'phone_filter.bin')):
+                self.filter._save_snapshot()
+                with mock.patch.dict(connection.settings_dict, NAME='other.sqlite3'):
+                    self.assertFalse(phone_filter.PhoneFilter()._load_snapshot())
+
+
+class ApplicationIdTests(TestCase):
+    """Workers get distinct node ids and a taken ID is retried"""
+
+    @override_settings(APP_ID_NODE='3')
+    def test_configured_node_is_per_worker(self):
+        with mock.patch('os.getpid', return_value=0x1234):
+            self.assertEqual(ids.default_node(), 0x0334)
+        with mock.patch('os.getpid', return_value=0x1235):
+            self.assertEqual(ids.default_node(), 0x0335)
+
+    @override_settings(APP_ID_NODE='3')
+    def test_fork_takes_a_new_node(self):
+        generator = ids.ApplicationIdGenerator()
+        with mock.patch('os.getpid', return_value=0x1234):
+            self.assertEqual(ids.parse(generator.next_id())[1], 0x0334)
+        with mock.patch('os.getpid', return_value=0x1235):
+            generator._reset()
+            self.assertEqual(ids.parse(generator.next_id())[1], 0x0335)
+
+    @override_settings(THROTTLE_RATES={})
+    def test_start_retries_a_taken_id(self):
+        customer = Customer.objects.create(
+            phone='9000000020', name='ID User', email='id@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        taken = LoanApplication.objects.create(customer=customer, application_id=ids.new_application_id())
+        fresh = ids.new_application_id()
+        with mock.patch.object(views, 'new_application_id', side_effect=[taken.application_id, fresh]):
+            response = self.client.post('/chatbot/api/start/', {'phone': '9000000020'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['application_id'], fresh)
+        self.assertEqual(customer.applications.count(), 2)
+
+
+class ArchiveTests(TestCase):
+    """Transcripts round-trip through cold storage and late messages are kept"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        archive_dir = override_settings(CHAT_ARCHIVE_DIR=tmpdir.name)
+        archive_dir.enable()
+        self.addCleanup(archive_dir.disable)
+        customer = Customer.objects.create(
+            phone='9000000030', name='Archive User', email='archive@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.application = LoanApplication.objects.create(
+            customer=customer, application_id='APPARCHIVE001', status='sanctioned'
+        )
+        for i in range(3):
+            ChatMessage.objects.create(application=self.application, message_type='user', content=f'Message {i}')
+        LoanApplication.objects.filter(pk=self.application.pk).update(
+            updated_at=self.application.updated_at - timedelta(days=100)
+        )
+        self.transcript = LoanApplicationSerializer(self.application).data['messages']
+
+    def during_archive(self, change):
+        """Run `change` between writing the segment and committing, as another worker could"""
+        sync = archive.SegmentWriter.sync
+        calls = []
+
+        def sync_then_change(writer):
+            sync(writer)
+            if not calls:
+                calls.append(change())
+
+        return mock.patch.object(archive.SegmentWriter, 'sync', sync_then_change)
+
+    def test_segment_round_trip(self):
+        writer = archive.SegmentWriter(settings.CHAT_ARCHIVE_DIR, max_bytes=1 << 20)
+        first = writer.write([{'id': 1, 'content': 'a'}])
+        second = writer.write([{'id': 2, 'content': 'b'}, {'id': 3, 'content': 'c'}])
+        writer.close()
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(second[1], first[1] + first[2])
+        self.assertEqual(archive.read_segment(*second), [{'id': 2, 'content': 'b'}, {'id': 3, 'content': 'c'}])
+
+    def test_archived_transcript_is_served(self):
+        self.assertEqual(archive.archive_transcripts(days=90), (1, 3))
+        self.assertFalse(self.application.messages.exists())
+        self.assertEqual(archive.load_transcript(self.application), self.transcript)
+        response = self.client.get(reverse('get_application', args=['APPARCHIVE001']))
+        self.assertEqual(response.json()['messages'], self.transcript)
+
+    def test_message_added_after_the_read_is_kept(self):
+        def late():
+            ChatMessage.objects.create(application=self.application, message_type='user', content='Late')
+
+        with self.during_archive(late):
+            self.assertEqual(archive.archive_transcripts(days=90), (1, 3))
+        self.assertEqual(list(self.application.messages.values_list('content', flat=True)), ['Late'])
+        messages = self.client.get(reverse('get_application', args=['APPARCHIVE001'])).json()['messages']
+        self.assertEqual([message['content'] for message in messages], ['Message 0', 'Message 1', 'Message 2', 'Late'])
+
+    def test_application_reopened_meanwhile_is_skipped(self):
+        def reopen():
+            LoanApplication.objects.filter(pk=self.application.pk).update(status='approved')
+
+        with self.during_archive(reopen):
+            self.assertEqual(archive.archive_transcripts(days=90), (0, 0))
+        self.assertEqual(self.application.messages.count(), 3)
+        self.assertEqual(archive.load_transcript(self.application), [])
+
+
+class FunnelRollupTests(TestCase):
+    """Live transitions and rebuilds count the furthest stage each application reached"""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            phone='9000000040', name='Funnel User', email='funnel@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.today = timezone.localdate()
+
+    def create(self, application_id):
+        return LoanApplication.objects.create(customer=self.customer, application_id=application_id)
+
+    def counts(self):
+        return dict(FunnelDaily.objects.filter(day=self.today).values_list('stage', 'count'))
+
+    def advance(self, application, *statuses):
+        for status in statuses:
+            application.status = status
+            application.save()
+
+    def test_skipped_stages_are_counted(self):
+        self.advance(self.create('APPFUNNEL0001'), 'sanctioned')
+        self.assertEqual(self.counts(), {stage: 1 for stage in funnel.FUNNEL})
+
+    def test_rebuild_matches_live_counts(self):
+        self.advance(self.create('APPFUNNEL0001'), 'emi_preview', 'kyc_done', 'approved', 'conditional')
+        self.advance(self.create('APPFUNNEL0002'), 'emi_preview', 'kyc_done', 'rejected')
+        self.advance(self.create('APPFUNNEL0003'), 'pre_offer')
+        live = self.counts()
+        self.assertEqual(live, {'initiated': 3, 'emi_preview': 2, 'kyc_done': 2, 'approved': 1})
+        self.assertEqual(funnel.rebuild(self.today, self.today), 4)
+        self.assertEqual(self.counts(), live)
+
+    def test_rebuild_picks_up_bypassed_saves_once(self):
+        application = self.create('APPFUNNEL0001')
+        LoanApplication.objects.filter(pk=application.pk).update(status='kyc_done')
+        funnel.rebuild(self.today, self.today)
+        self.assertEqual(self.counts(), {'initiated': 1, 'emi_preview': 1, 'kyc_done': 1})
+        # A stale instance saving the same status does not count it again
+        self.advance(application, 'kyc_done', 'approved')
+        self.assertEqual(self.counts(), {'initiated': 1, 'emi_preview': 1, 'kyc_done': 1, 'approved': 1})
+
+    def test_concurrent_saves_count_once(self):
+        first = self.create('APPFUNNEL0001')
+        second = LoanApplication.objects.get(pk=first.pk)
+        self.advance(first, 'approved')
+        self.advance(second, 'approved')
+        self.assertEqual(self.counts()['approved'], 1)
+
+    def test_migration_backfills_existing_applications(self):
+        self.advance(self.create('APPFUNNEL0001'), 'emi_preview', 'kyc_done', 'rejected')
+        LoanApplication.objects.bulk_create([
+            LoanApplication(customer=self.customer, application_id='APPFUNNEL0002', status='approved',
+                            requested_amount=100000),
+        ])
+        FunnelProgress.objects.all().delete()
+        FunnelDaily.objects.all().delete()
+        migration = importlib.import_module('chatbot.migrations.0009_funnelprogress')
+        migration.backfill_funnel(django_apps, None)
+        self.assertEqual(self.counts(), {'initiated': 2, 'emi_preview': 2, 'kyc_done': 2, 'approved': 1})
+        self.assertEqual(FunnelDaily.objects.get(day=self.today, stage='emi_preview').amount_count, 1)
+        # Already counted, so a later save adds nothing
+        self.advance(LoanApplication.objects.get(application_id='APPFUNNEL0002'), 'approved')
+        self.assertEqual(self.counts()['approved'], 1)
+
+
+class AnalyticsExportTests(TestCase):
+    """Exports are incremental, render templated messages and leave out PII"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.output = tmpdir.name
+        customer = Customer.objects.create(
+            phone='9000000050', name='Export User', email='export@loanwise.com',
+            pre_approved_limit=300000, pre_approved_rate=13.0
+        )
+        self.application = LoanApplication.objects.create(
+            customer=customer, application_id='APPEXPORT0001', status='kyc_done',
+            kyc_aadhar='234567890124', kyc_pan='ABCPE1234F', kyc_verified=True
+        )
+        self.message = ChatMessage.objects.create(
+            application=self.application, message_type='sales_agent',
+            content="Perfect! Your monthly EMI will be ₹8,932. Now let's verify your KYC."
+        )
+
+    def read(self, table):
+        return pq.read_table(os.path.join(self.output, table)).to_pylist()
+
+    def test_round_trip(self):
+        self.assertIsNotNone(self.message.template)
+        counts = analytics_export.export(self.output, lag=0)
+        self.assertEqual(counts, {'customers': 1, 'loan_applications': 1, 'chat_messages': 1})
+
+        [message] = self.read('chat_messages')
+        self.assertEqual(message['content'], self.message.text)
+        [application] = self.read('loan_applications')
+        self.assertEqual((application['application_id'], application['status']), ('APPEXPORT0001', 'kyc_done'))
+        self.assertEqual(application['date'], str(timezone.localdate(self.application.updated_at)))
+
+    @override_settings(THROTTLE_RATES={})
+    def test_journey_pii_is_not_exported(self):
+        app_id = self.client.post(
+            '/chatbot/api/start/', {'phone': '9000000051'}, content_type='application/json'
+        ).json()['application_id']
+        steps = [
+            ('/chatbot/api/save_new_user_details/', {
+                'name': 'Journey Person', 'email': 'journey.person@example.com', 'dob': '14/03/1987',
+                'address': '42 Residency Road', 'income': 80000,
+            }),
+            ('/chatbot/api/emi/', {'amount': 100000, 'tenure': 12}),
+            ('/chatbot/api/kyc/', {'aadhar': '234567890124', 'pan': 'ABCPE1234F'}),
+        ]
+        for url, payload in steps:
+            response = self.client.post(url, {'application_id': app_id, **payload}, content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+
+        analytics_export.export(self.output, lag=0)
+        [customer] = [row for row in self.read('customers') if row['id'] != self.application.customer_id]
+        self.assertFalse({'phone', 'name', 'email'} & set(customer))
+        self.assertFalse({'kyc_aadhar', 'kyc_pan'} & set(self.read('loan_applications')[0]))
+        messages = self.read('chat_messages')
+        exported = str(self.read('customers') + self.read('loan_applications') + messages)
+        for value in ('9000000051', 'Journey Person', 'journey.person@example.com', '14/03/1987',
+                      'Residency Road', '234567890124', 'ABCPE1234F', '9000000050', 'export@loanwise.com'):
+            self.assertNotIn(value, exported)
+        self.assertTrue(all(row['content'] is None for row in messages if row['message_type'] == 'user'))
+        self.assertIn('✅ KYC Verification Successful!', [(row['content'] or '').split('\n')[0] for row in messages])
+
+    def test_watermarks_make_runs_incremental(self):
+        analytics_export.export(self.output, lag=0)
+        watermarks = analytics_export.load_watermarks(self.output)
+        self.assertEqual(watermarks['loan_applications']['id'], self.application.id)
+        self.assertEqual(analytics_export.export(self.output, lag=0),
+                         {'customers': 0, 'loan_applications': 0, 'chat_messages': 0})
+
+        self.application.status = 'approved'
+        self.application.save()
+        self.assertEqual(analytics_export.export(self.output, lag=0),
+                         {'customers': 0, 'loan_applications': 1, 'chat_messages': 0})
+        statuses = sorted(row['status'] for row in self.read('loan_applications'))
+        self.assertEqual(statuses, ['approved', 'kyc_done'])
+        self.assertFalse([name for _, _, files in os.walk(self.output) for name in files if name.endswith('.tmp')])
@@ -0,0 +1,160 @@
+"""
+Sliding-window rate limits per client IP and per phone number.
+
+Each limit uses the sliding-window counter approximation. It keeps a count
+for the current and previous fixed windows, weights the previous count by
+how much of it still overlaps the sliding window, and compares the sum to
+the limit. That is O(1) memory per key. Counters live in process memory
+by default (THROTTLE_BACKEND='local'); 'cache' shares them through the
+Django cache across workers.
+
+Limits are configured per endpoint in THROTTLE_RATES, e.g.
+    {'start': {'ip': '30/min', 'phone': '5/min'}}
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class LocalWindowStore:
+    """Per-process counters guarded by one lock, at most max_keys of them.
+
+    Keys are kept in least-recently-hit order; a new key past max_keys evicts
+    the oldest one in O(1). That key has gone longest without a request, so
+    its windows are the likeliest to have expired anyway.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now):
+        index = int(now // window)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or entry[0] < index - 1:
+                entry = [index, 0, 0]
+            elif entry[0] == index - 1:
+                entry = [index, 0, entry[1]]
+            _, current, previous = entry
+
+            elapsed = now - index * window
+            estimate = previous * (1 - elapsed / window) + current
+            allowed = estimate < limit
+            if allowed:
+                entry[1] += 1
+            self._store(key, entry)
+            return (True, 0) if allowed else (False, window - elapsed)
+
+    def _store(self, key, entry):
+        if key in self._windows:
+            self._windows.move_to_end(key)
+        elif len(self._windows) >= self.max_keys:
+            self._windows.popitem(last=False)
+        self._windows[key] = entry
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+
+
+class CacheWindowStore:
+    """Counters in the Django cache, shared by every worker"""
+
+    def hit(self, key, limit, window, now):
+        index = int(now // window)
+        current_key = f'throttle:{key}:{index}'
+        previous_key = f'throttle:{key}:{index - 1}'
+        counts = cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+
+        elapsed = now - index * window
+        if previous * (1 - elapsed / window) + current >= limit:
+            return False, window - elapsed
+
+        if not cache.add(current_key, 1, window * 2):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                cache.set(current_key, 1, window * 2)
+        return True, 0
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if getattr(settings, 'THROTTLE_BACKEND', 'local') == 'cache':
+            _store = CacheWindowStore()
+        else:
+            _store = LocalWindowStore()
+    return _store
+
+
+def _client_ip(request):
+    # Only trust X-Forwarded-For when running behind a known proxy
+    if getattr(settings, 'THROTTLE_TRUST_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _phone_key(request):
+    phone = request.data.get('phone', '') if hasattr(request.data, 'get') else ''
+    phone = str(phone).strip()
+    if not phone:
+        return None
+    return hashlib.sha256(phone.encode()).hexdigest()[:32]
+
+
+def throttle(endpoint):
+    """Reject requests over the endpoint's IP/phone limits with 429 before the view runs.
+
+    Place it below @api_view so request.data is available.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rates = getattr(settings, 'THROTTLE_RATES', {}).get(endpoint)
+            if rates:
+                store = get_store()
+                now = time.time()
+                idents = {'ip': _client_ip(request), 'phone': _phone_key(request)}
+                for scope, rate in rates.items():
+                    ident = idents.get(scope)
+                    if not ident:
+                        continue
+                    limit, window = parse_rate(rate)
+                    allowed, retry_after = store.hit(f'{endpoint}:{scope}:{ident}', limit, window, now)
+                    if not allowed:
+                        response = Response(
+                            {'error': 'Too many requests, please try again shortly.'},
+                            status=status.HTTP_429_TOO_MANY_REQUESTS
+                        )
+                        response['Retry-After'] = str(int(retry_after) + 1)
+                        return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
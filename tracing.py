@@ -0,0 +1,282 @@
+"""
+Lightweight tracing with OpenTelemetry-compatible export.
+
+`span()` works as a context manager or decorator. Spans nest through a
+contextvar, so agent steps, DB queries and ChatMessage writes made while a
+request is being handled all share the request's trace id. Finished spans
+are exported in OTLP/JSON, either appended to a local file or posted to a
+collector's /v1/traces endpoint, from a background thread.
+
+When TRACING_ENABLED is off, `span()` hands back a shared no-op object and
+TracingMiddleware removes itself.
+"""
+
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+
+ENABLED = getattr(settings, 'TRACING_ENABLED', False)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar('chatbot_current_span', default=None)
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class Span(ContextDecorator):
+    """A timed operation. Use as `with span(...)` or `@span(...)`."""
+
+    def __init__(self, name, kind=SPAN_KIND_INTERNAL, trace_id=None, parent_span_id=None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self._trace_id = trace_id
+        self._parent_span_id = parent_span_id
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.trace_id = self._trace_id or (parent.trace_id if parent else _new_id(16))
+        self.parent_span_id = self._parent_span_id or (parent.span_id if parent else '')
+        self.span_id = _new_id(8)
+        self.status = STATUS_OK
+        self.status_message = ''
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = STATUS_ERROR
+            self.status_message = f'{exc_type.__name__}: {exc}'
+        get_processor().on_end(self.to_otlp())
+        return False
+
+    def _recreate_cm(self):
+        # Fresh span per decorated call so ids are never reused
+        return Span(self.name, self.kind, **self.attributes)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        data = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [
+                {'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            'status': {'code': self.status},
+        }
+        if self.parent_span_id:
+            data['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            data['status']['message'] = self.status_message
+        return data
+
+
+class _NoopSpan(ContextDecorator):
+    trace_id = span_id = parent_span_id = ''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **kwargs):
+    """Start a span (no-op when tracing is disabled)"""
+    if not ENABLED:
+        return NOOP_SPAN
+    return Span(name, **kwargs)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def trace_context():
+    """{'trace_id', 'span_id'} of the active span, or {} outside a trace"""
+    active = _current_span.get()
+    if active is None:
+        return {}
+    return {'trace_id': active.trace_id, 'span_id': active.span_id}
+
+
+# Exporters
+
+def _resource_spans(spans):
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': settings.TRACING_SERVICE_NAME}},
+            ]},
+            'scopeSpans': [{'scope': {'name': 'chatbot.tracing'}, 'spans': spans}],
+        }]
+    }
+
+
+class FileSpanExporter:
+    """Appends one OTLP/JSON ExportTraceServiceRequest per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(_resource_spans(spans)) + '\n')
+
+
+class OTLPHTTPSpanExporter:
+    """Posts OTLP/JSON to a collector, e.g. http://localhost:4318/v1/traces"""
+
+    def __init__(self, endpoint, timeout=5):
+        import requests
+
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def export(self, spans):
+        self.session.post(self.endpoint, json=_resource_spans(spans), timeout=self.timeout)
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches off the request path"""
+
+    def __init__(self, exporter, max_queue_size=2048, batch_size=256, interval=1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(max_queue_size)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+
+    def on_end(self, span_data):
+        try:
+            self.queue.put_nowait(span_data)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception as e:
+                    print(f"Error in BatchSpanProcessor: {str(e)}")
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor():
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                if settings.TRACING_EXPORTER == 'otlp':
+                    exporter = OTLPHTTPSpanExporter(settings.TRACING_OTLP_ENDPOINT)
+                else:
+                    exporter = FileSpanExporter(settings.TRACING_FILE)
+                _processor = BatchSpanProcessor(exporter)
+    return _processor
+
+
+# Django integration
+
+def _parse_traceparent(header):
+    """W3C traceparent -> (trace_id, parent_span_id), or (None, None)"""
+    parts = header.split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+def _trace_query(execute, sql, params, many, context):
+    with Span('db.query', kind=SPAN_KIND_CLIENT, **{'db.statement': sql[:500]}):
+        return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """Opens a server span per request and a child span per DB query"""
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace_id, parent_span_id = _parse_traceparent(request.headers.get('traceparent', ''))
+        with Span(
+            f'{request.method} {request.path}', kind=SPAN_KIND_SERVER,
+            trace_id=trace_id, parent_span_id=parent_span_id,
+            **{'http.method': request.method, 'http.target': request.path}
+        ) as root:
+            with connection.execute_wrapper(_trace_query):
+                response = self.get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            if match:
+                root.name = f'{request.method} {match.route}'
+                root.set_attribute('http.route', match.route)
+            root.set_attribute('http.status_code', response.status_code)
+        response['traceparent'] = f'00-{root.trace_id}-{root.span_id}-01'
+        return response
+
+
+def tag_chat_message(sender, instance, **kwargs):
+    """pre_save receiver stamping ChatMessage.metadata with the active trace"""
+    context = trace_context()
+    if context and 'trace_id' not in (instance.metadata or {}):
+        instance.metadata = {**(instance.metadata or {}), **context}
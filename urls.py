@@ -17,7 +17,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from chatbot import views as chatbot_views
+from chatbot.metrics import metrics_view
+from chatbot.profiling import profiling_admin, profiling_download
+
 urlpatterns = [
+    path('admin/profiling/', profiling_admin, name='profiling_admin'),
+    path('admin/profiling/download/', profiling_download, name='profiling_download'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('chatbot/api/kyc/bulk/', chatbot_views.verify_kyc_bulk, name='verify_kyc_bulk'),
+    path('chatbot/api/chat/', chatbot_views.chat_turn, name='chat_turn'),
+    path('chatbot/api/chat/stream/', chatbot_views.chat_stream, name='chat_stream'),
+    path('chatbot/api/dashboard/funnel/', chatbot_views.funnel_dashboard, name='funnel_dashboard'),
+    path('chatbot/api/quotes/<str:app_id>/', chatbot_views.quote_grid, name='quote_grid'),
+    path('chatbot/api/affordability/', chatbot_views.affordability, name='affordability'),
     path('chatbot/', include('chatbot.urls')),
 ]
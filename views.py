@@ -1,14 +1,34 @@
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from asgiref.sync import sync_to_async
+import hashlib
 import json
-import uuid
 from datetime import datetime
 
 from .models import Customer, LoanApplication, ChatMessage
-from .serializers import LoanApplicationSerializer, ChatMessageSerializer
+from .serializers import (
+    KYCBulkRequestSerializer, ChatRequestSerializer, AffordabilityRequestSerializer, loan_application_data
+)
+from .kyc import get_kyc_service
+from .idempotency import idempotent
+from .throttling import throttle
+from .phone_filter import phone_filter
+from .ids import new_application_id
+from .archive import ARCHIVABLE_STATUSES, load_transcript
+from .funnel import dashboard as funnel_dashboard_data
+from .quotes import quote_grid as quote_grid_data
+from .conversation import confirm, guard, load_state
+from .tracing import span
 from .services import (
     MasterAgent, SalesAgent, VerificationAgent,
     UnderwritingAgent, SanctionAgent
@@ -20,8 +40,47 @@ def index(request):
     return render(request, 'chatbot/index.html')
 
 
+def _find_customer(phone):
+    # Numbers the phone filter has never seen skip the lookup
+    if not phone_filter.might_exist(phone):
+        return None
+    return Customer.objects.filter(phone=phone).first()
+
+
+def _create_customer(phone):
+    """Return (customer, created) without racing concurrent first visits"""
+    try:
+        # Savepoint: a concurrent insert of the same phone only rolls back this
+        with transaction.atomic():
+            return Customer.objects.create(
+                phone=phone,
+                name=f"User {phone[-4:]}",  # Temporary name - will be updated
+                email=f"user_{phone}@loanwise.com",  # Temporary email - will be updated
+                pre_approved_limit=300000,
+                pre_approved_rate=13.0
+            ), True
+    except IntegrityError:
+        return Customer.objects.get(phone=phone), False
+
+
+def _create_application(customer, initial_status, attempts=3):
+    """Create an application, drawing a fresh ID if the last one was already taken"""
+    for attempt in range(attempts):
+        try:
+            # Savepoint: a duplicate ID only rolls back this insert
+            with transaction.atomic():
+                return LoanApplication.objects.create(
+                    customer=customer, application_id=new_application_id(), status=initial_status
+                )
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
 @csrf_exempt
 @api_view(['POST'])
+@throttle('start')
+@idempotent
 def start_application(request):
     """Initialize a new loan application or retrieve existing customer"""
     try:
@@ -34,28 +93,16 @@ def start_application(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if customer exists
-        is_new_user = False
-        try:
-            customer = Customer.objects.get(phone=phone)
-        except Customer.DoesNotExist:
-            # Create new customer with minimal data
-            is_new_user = True
-            customer = Customer.objects.create(
-                phone=phone,
-                name=f"User {phone[-4:]}",  # Temporary name - will be updated
-                email=f"user_{phone}@loanwise.com",  # Temporary email - will be updated
-                pre_approved_limit=300000,
-                pre_approved_rate=13.0
+        # Look up outside the transaction so it opens with a write; the customer
+        # and first application are then created together or not at all
+        customer, is_new_user = _find_customer(phone), False
+        with transaction.atomic():
+            if customer is None:
+                customer, is_new_user = _create_customer(phone)
+            application = _create_application(
+                customer, 'pre_offer' if not is_new_user else 'new_user_details'
             )
-        
-        # Create new loan application
-        app_id = f"APP{uuid.uuid4().hex[:10].upper()}"
-        application = LoanApplication.objects.create(
-            customer=customer,
-            application_id=app_id,
-            status='pre_offer' if not is_new_user else 'new_user_details'
-        )
+        app_id = application.application_id
         
         # Return appropriate response based on user type
         if is_new_user:
@@ -106,12 +153,9 @@ def start_application(request):
         )
 
 
-@csrf_exempt
-@api_view(['POST'])
-def save_new_user_details(request):
+def _save_new_user_details(data):
     """Save new user details to database"""
     try:
-        data = request.data
         app_id = data.get('application_id')
         phone = data.get('phone')
         name = data.get('name')
@@ -120,8 +164,15 @@ def save_new_user_details(request):
         address = data.get('address')
         income = data.get('income')
         
+        _, error = guard(app_id, 'details')
+        if error:
+            return error
+        
         # Get the application and customer
         application = LoanApplication.objects.get(application_id=app_id)
+        error = confirm(application, 'details')
+        if error:
+            return error
         customer = application.customer
         
         # Update customer with real details
@@ -136,7 +187,7 @@ def save_new_user_details(request):
         
         # Update application status and income
         application.monthly_income = int(income)
-        application.status = 'emi'
+        application.status = 'pre_offer'
         application.save()
         
         # Save user details as chat message for history
@@ -182,15 +233,26 @@ def save_new_user_details(request):
 
 @csrf_exempt
 @api_view(['POST'])
-def process_emi(request):
+def save_new_user_details(request):
+    """Save new user details to database"""
+    return _save_new_user_details(request.data)
+
+
+def _process_emi(data):
     """Process EMI selection"""
     try:
-        data = request.data
         app_id = data.get('application_id')
         amount = data.get('amount')
         tenure = data.get('tenure')
         
+        _, error = guard(app_id, 'emi')
+        if error:
+            return error
+        
         application = LoanApplication.objects.get(application_id=app_id)
+        error = confirm(application, 'emi')
+        if error:
+            return error
         
         # Calculate EMI
         emi = SalesAgent.calculate_emi(amount, application.customer.pre_approved_rate, tenure)
@@ -230,15 +292,27 @@ def process_emi(request):
 
 @csrf_exempt
 @api_view(['POST'])
-def verify_kyc(request):
+@idempotent
+def process_emi(request):
+    """Process EMI selection"""
+    return _process_emi(request.data)
+
+
+def _verify_kyc(data):
     """Verify KYC documents"""
     try:
-        data = request.data
         app_id = data.get('application_id')
         aadhar = data.get('aadhar', '').strip()
         pan = data.get('pan', '').strip().upper()
         
+        _, error = guard(app_id, 'kyc')
+        if error:
+            return error
+        
         application = LoanApplication.objects.get(application_id=app_id)
+        error = confirm(application, 'kyc')
+        if error:
+            return error
         
         result = VerificationAgent.verify_kyc(application, aadhar, pan)
         
@@ -270,14 +344,57 @@ def verify_kyc(request):
 
 @csrf_exempt
 @api_view(['POST'])
-def check_eligibility(request):
+@idempotent
+def verify_kyc(request):
+    """Verify KYC documents"""
+    return _verify_kyc(request.data)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@throttle('kyc_bulk')
+def verify_kyc_bulk(request):
+    """Verify many Aadhaar/PAN pairs in one call (staff only)"""
+    serializer = KYCBulkRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        items = serializer.validated_data['items']
+        results = get_kyc_service().verify_many(
+            [(item['aadhar'], item['pan']) for item in items]
+        )
+        
+        return Response({
+            'success': True,
+            'verified': sum(1 for result in results if result['valid']),
+            'total': len(results),
+            'results': [
+                {'reference': item.get('reference', ''), **result}
+                for item, result in zip(items, results)
+            ]
+        })
+    
+    except Exception as e:
+        print(f"Error in verify_kyc_bulk: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _check_eligibility(data):
     """Check loan eligibility"""
     try:
-        data = request.data
         app_id = data.get('application_id')
         monthly_income = data.get('monthly_income')
         
+        _, error = guard(app_id, 'eligibility')
+        if error:
+            return error
+        
         application = LoanApplication.objects.get(application_id=app_id)
+        error = confirm(application, 'eligibility')
+        if error:
+            return error
         
         result = UnderwritingAgent.check_eligibility(application, monthly_income)
         
@@ -325,13 +442,25 @@ def check_eligibility(request):
 
 @csrf_exempt
 @api_view(['POST'])
-def generate_sanction_letter(request):
+@idempotent
+def check_eligibility(request):
+    """Check loan eligibility"""
+    return _check_eligibility(request.data)
+
+
+def _generate_sanction_letter(data):
     """Generate sanction letter"""
     try:
-        data = request.data
         app_id = data.get('application_id')
         
+        _, error = guard(app_id, 'sanction')
+        if error:
+            return error
+        
         application = LoanApplication.objects.get(application_id=app_id)
+        error = confirm(application, 'sanction')
+        if error:
+            return error
         
         if application.status != 'approved':
             return Response(
@@ -367,19 +496,231 @@ def generate_sanction_letter(request):
 
 
 @csrf_exempt
+@api_view(['POST'])
+@idempotent
+def generate_sanction_letter(request):
+    """Generate sanction letter"""
+    return _generate_sanction_letter(request.data)
+
+
+# Stage handlers the chat endpoint dispatches to, keyed by conversation stage
+STAGE_HANDLERS = {
+    'new_user_details': _save_new_user_details,
+    'emi': _process_emi,
+    'kyc': _verify_kyc,
+    'eligibility': _check_eligibility,
+    'sanction': _generate_sanction_letter,
+}
+
+
+def _prepare_chat(payload):
+    """Validate a chat request against the server-side stage.
+
+    Returns (app_id, steps, state, None, None) or
+    (None, None, None, error_payload, error_status).
+    """
+    serializer = ChatRequestSerializer(data=payload)
+    if not serializer.is_valid():
+        return None, None, None, serializer.errors, status.HTTP_400_BAD_REQUEST
+    
+    data = serializer.validated_data
+    app_id = data['application_id']
+    steps = data.get('steps') or [data.get('data', {})]
+    
+    state = load_state(app_id)
+    if state is not None and (
+        (data.get('stage') and data['stage'] != state.stage) or state.stage not in STAGE_HANDLERS
+    ):
+        # Only answer 409 from the database, not from a possibly stale cached state
+        state = load_state(app_id, refresh=True)
+    if state is None:
+        return None, None, None, {'error': 'Application not found'}, status.HTTP_404_NOT_FOUND
+    
+    # A client that is out of sync gets the real stage back instead of a wrong dispatch
+    if data.get('stage') and data['stage'] != state.stage:
+        return None, None, None, {
+            'error': f"Application is at stage '{state.stage}'", 'stage': state.stage
+        }, status.HTTP_409_CONFLICT
+    if state.stage not in STAGE_HANDLERS:
+        return None, None, None, {
+            'error': 'Nothing to process for this application', 'stage': state.stage
+        }, status.HTTP_409_CONFLICT
+    
+    return app_id, steps, state, None, None
+
+
+def _iter_chat_steps(app_id, steps, state):
+    """Run steps in order, yielding (stage, response) and stopping at the first failure"""
+    for step in steps:
+        handler = STAGE_HANDLERS.get(state.stage)
+        if handler is None:
+            return
+        with span(f'chat.step.{state.stage}', **{'application.id': app_id}):
+            response = handler({**step, 'application_id': app_id})
+        yield state.stage, response
+        if response.status_code >= 400 or not response.data.get('success', True):
+            return
+        state = load_state(app_id)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@idempotent
+def chat_turn(request):
+    """Run one or more form steps, routed by the server-side conversation stage"""
+    app_id, steps, state, error, error_status = _prepare_chat(request.data)
+    if error:
+        return Response(error, status=error_status)
+    
+    turns = []
+    response_status = status.HTTP_200_OK
+    for stage, response in _iter_chat_steps(app_id, steps, state):
+        turns.append({'step': stage, **response.data})
+        response_status = response.status_code
+    
+    return Response({
+        'success': response_status < 400 and all(turn.get('success', True) for turn in turns),
+        'application_id': app_id,
+        'stage': load_state(app_id).stage,
+        'turns': turns
+    }, status=response_status)
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _stream_chat_steps(app_id, steps, state):
+    # Flush headers and a first byte before any agent work starts
+    yield ': stream open\n\n'
+    
+    steps_iter = _iter_chat_steps(app_id, steps, state)
+    # Every step handler runs ORM queries, so steps stay on the thread that owns the
+    # connection; a turn's steps are sequential anyway, and SSE only changes when
+    # each result reaches the client
+    next_step = sync_to_async(next, thread_sensitive=True)
+    success = True
+    try:
+        while True:
+            item = await next_step(steps_iter, None)
+            if item is None:
+                break
+            stage, response = item
+            success = success and response.status_code < 400 and response.data.get('success', True)
+            yield _sse_event('step', {'step': stage, 'status': response.status_code, **response.data})
+        state = await sync_to_async(load_state, thread_sensitive=True)(app_id)
+        yield _sse_event('done', {'success': success, 'application_id': app_id, 'stage': state.stage})
+    except Exception as e:
+        print(f"Error in chat_stream: {str(e)}")
+        yield _sse_event('error', {'error': str(e)})
+
+
+@csrf_exempt
+@require_POST
+async def chat_stream(request):
+    """Chat turn over Server-Sent Events, one event per completed step"""
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    app_id, steps, state, error, error_status = await sync_to_async(_prepare_chat)(payload)
+    if error:
+        return JsonResponse(error, status=error_status)
+    
+    response = StreamingHttpResponse(
+        _stream_chat_steps(app_id, steps, state), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _application_etag(request, app_id):
+    """Validator for get_application from timestamps and message counts, without serializing"""
+    row = LoanApplication.objects.filter(application_id=app_id).annotate(
+        message_count=Count('messages'), last_message=Max('messages__id')
+    ).values_list('id', 'updated_at', 'customer__updated_at', 'message_count', 'last_message').first()
+    if row is None:
+        return None
+    return hashlib.md5(repr(row).encode(), usedforsecurity=False).hexdigest()
+
+
+@csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_application_etag)
 @api_view(['GET'])
 def get_application(request, app_id):
     """Retrieve application details and chat history"""
     try:
-        application = LoanApplication.objects.get(application_id=app_id)
-        serializer = LoanApplicationSerializer(application)
-        return Response(serializer.data)
+        application = LoanApplication.objects.select_related('customer').get(application_id=app_id)
+        with span('serialize.LoanApplication'):
+            data = loan_application_data(application)
+        # Finished applications may have had their transcript moved to cold storage;
+        # anything still in chat_messages was added after it was archived
+        if application.status in ARCHIVABLE_STATUSES:
+            data['messages'] = load_transcript(application) + data['messages']
+        return Response(data)
     except LoanApplication.DoesNotExist:
         return Response({'error': 'Application not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
 @csrf_exempt
 @api_view(['POST'])
+def affordability(request):
+    """Largest loan per tenure for a target EMI and/or the FOIR cap on income"""
+    serializer = AffordabilityRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    
+    try:
+        application = LoanApplication.objects.select_related('customer').get(
+            application_id=data['application_id']
+        )
+    except LoanApplication.DoesNotExist:
+        return Response({'error': 'Application not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    budgets = {}
+    if data.get('target_emi'):
+        budgets['target_emi'] = data['target_emi']
+    income = data.get('monthly_income') or application.monthly_income
+    if income:
+        budgets['foir'] = int(income * UnderwritingAgent.FOIR_LIMIT / 100)
+    if not budgets:
+        return Response(
+            {'error': 'Provide target_emi or monthly_income'}, status=status.HTTP_400_BAD_REQUEST
+        )
+    limited_by = min(budgets, key=budgets.get)
+    
+    options = {'tenures': data['tenures']} if 'tenures' in data else {}
+    result = SalesAgent.affordability(application.customer, budgets[limited_by], **options)
+    return Response({
+        **result,
+        'application_id': application.application_id,
+        'limited_by': limited_by,
+        'interest_rate': float(application.customer.pre_approved_rate),
+        'pre_approved_limit': float(application.customer.pre_approved_limit)
+    })
+
+
+@csrf_exempt
+@cache_control(private=True, max_age=300)
+@api_view(['GET'])
+def quote_grid(request, app_id):
+    """Every EMI for the customer's rate and limit, for the amount/tenure sliders"""
+    try:
+        rate, limit = LoanApplication.objects.filter(application_id=app_id).values_list(
+            'customer__pre_approved_rate', 'customer__pre_approved_limit'
+        ).get()
+    except LoanApplication.DoesNotExist:
+        return Response({'error': 'Application not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'application_id': app_id, **quote_grid_data(rate, limit)})
+
+
+@csrf_exempt
+@api_view(['POST'])
+@throttle('check_user')
 def check_user_status(request):
     """Check if user exists in system"""
     try:
@@ -387,6 +728,8 @@ def check_user_status(request):
         phone = data.get('phone', '').strip()
         
         try:
+            if not phone_filter.might_exist(phone):
+                raise Customer.DoesNotExist
             customer = Customer.objects.get(phone=phone)
             return Response({
                 'exists': True,
@@ -405,4 +748,15 @@ def check_user_status(request):
             })
             
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def funnel_dashboard(request):
+    """Loan funnel counts, conversion and approval rate per day, read from the rollups"""
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        return Response({'error': 'days must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(funnel_dashboard_data(days))
\ No newline at end of file